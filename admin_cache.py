@@ -0,0 +1,84 @@
+"""
+Per-chat administrator roster cache
+Answers "is this user an admin?" from memory instead of calling get_chat_member per message
+"""
+import asyncio
+from typing import Dict, Set
+from pyrogram import Client
+from pyrogram.enums import ChatMemberStatus, ChatMembersFilter
+from pyrogram.types import Message
+from cache import TTLCache
+from config import Config
+from logger import LOGGER
+
+ADMIN_STATUSES = (ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR)
+
+class AdminCache:
+    """Admin user ids per chat, loaded with one get_chat_members call and kept for a TTL
+
+    Rosters are also patched incrementally from chat-member updates and from
+    /promote and /demote, so the TTL only bounds drift from missed updates.
+    """
+
+    def __init__(self, ttl: float = 600, max_chats: int = 10000):
+        self._rosters = TTLCache(max_chats, ttl)  # chat_id -> set of admin user ids
+        self._loading: Dict[int, asyncio.Future] = {}
+
+    async def is_admin(self, client: Client, chat_id: int, user_id: int) -> bool:
+        """Check if user is an owner or administrator of the chat"""
+        admins = self._rosters.get(chat_id)
+        if admins is None:
+            try:
+                admins = await self._load(client, chat_id)
+            except Exception as e:
+                # Roster unavailable: answer this one question directly, cache nothing
+                LOGGER.warning(f"Admin roster load failed for {chat_id}: {e}")
+                member = await client.get_chat_member(chat_id, user_id)
+                return member.status in ADMIN_STATUSES
+        return user_id in admins
+
+    async def is_sender_admin(self, client: Client, message: Message) -> bool:
+        """Check if a message was sent by an admin, including anonymous admins posting as the chat"""
+        if message.sender_chat and message.sender_chat.id == message.chat.id:
+            return True
+        if not message.from_user:
+            return False
+        return await self.is_admin(client, message.chat.id, message.from_user.id)
+
+    async def _load(self, client: Client, chat_id: int) -> Set[int]:
+        """Fetch a chat's roster; concurrent callers for the same chat share one request"""
+        future = self._loading.get(chat_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(client, chat_id))
+            self._loading[chat_id] = future
+            future.add_done_callback(lambda _: self._loading.pop(chat_id, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, client: Client, chat_id: int) -> Set[int]:
+        generation = self._rosters.generation
+        admins = set()
+        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.ADMINISTRATORS):
+            admins.add(member.user.id)
+        self._rosters.set(chat_id, admins, generation)
+        return admins
+
+    def update(self, chat_id: int, user_id: int, is_admin: bool):
+        """Apply a single promotion or demotion to a cached roster"""
+        admins = self._rosters.get(chat_id, count=False)
+        if admins is None:
+            return  # Not cached; the next lookup loads a fresh roster anyway
+        if is_admin:
+            admins.add(user_id)
+        else:
+            admins.discard(user_id)
+
+    def invalidate(self, chat_id: int):
+        """Forget a chat's roster so the next lookup reloads it"""
+        self._rosters.invalidate(chat_id)
+
+    def stats(self) -> Dict[str, float]:
+        """Cached chat count and hit/miss counters"""
+        return self._rosters.stats()
+
+# Process-wide roster cache shared by every plugin
+admin_cache = AdminCache(ttl=Config.ADMIN_CACHE_TTL)
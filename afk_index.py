@@ -0,0 +1,107 @@
+"""
+In-memory AFK index
+Answers "is anyone in this message AFK?" from memory; the afk table is written through
+and only read once, at startup
+"""
+import re
+from typing import Any, Dict, List, Optional
+from pyrogram.enums import MessageEntityType
+from pyrogram.types import Message, User
+from database import db
+from logger import LOGGER
+
+# @username as Telegram allows it: 5-32 letters, digits and underscores
+USERNAME_MENTION = re.compile(r"(?<!\w)@([A-Za-z]\w{4,31})\b")
+
+class AfkIndex:
+    """AFK rows by user id, plus the usernames of AFK users for @mention lookups
+
+    Nearly every group message comes from someone who is not AFK and mentions
+    nobody who is, so the common case is one empty-dict check.
+    """
+
+    def __init__(self):
+        self._users: Dict[int, Dict[str, Any]] = {}  # user_id -> afk row
+        self._usernames: Dict[str, int] = {}  # lowercase username -> user_id
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._users.get(user_id)
+
+    async def load(self):
+        """Fill the index from the database; call once after the database starts"""
+        self._users.clear()
+        self._usernames.clear()
+        for row in await db.get_all_afk():
+            self._add(row)
+        LOGGER.info(f"AFK index loaded: {len(self._users)} users")
+
+    def _add(self, row: Dict[str, Any]):
+        self._users[row["user_id"]] = row
+        if row.get("username"):
+            self._usernames[row["username"].lower()] = row["user_id"]
+
+    async def set(self, user: User, reason: Optional[str] = None):
+        """Mark a user AFK (database first, so the index never claims an unsaved state)"""
+        await db.set_afk(user.id, reason, user.username, user.first_name)
+        self.discard(user.id)
+        self._add({
+            "user_id": user.id,
+            "reason": reason,
+            "afk": 1,
+            "username": user.username,
+            "first_name": user.first_name,
+        })
+
+    async def remove(self, user_id: int) -> bool:
+        """Clear a user's AFK status; returns False if they were not AFK"""
+        if not self.discard(user_id):
+            return False
+        await db.remove_afk(user_id)
+        return True
+
+    def discard(self, user_id: int) -> bool:
+        row = self._users.pop(user_id, None)
+        if row is None:
+            return False
+        if row.get("username"):
+            self._usernames.pop(row["username"].lower(), None)
+        return True
+
+    def mentioned(self, message: Message) -> List[Dict[str, Any]]:
+        """AFK rows for the reply target and every user mentioned in the message"""
+        if not self._users:
+            return []
+        user_ids = []
+        reply = message.reply_to_message
+        if reply and reply.from_user:
+            user_ids.append(reply.from_user.id)
+
+        for entity in message.entities or message.caption_entities or ():
+            if entity.type == MessageEntityType.TEXT_MENTION and entity.user:
+                user_ids.append(entity.user.id)
+        if self._usernames:
+            text = message.text or message.caption or ""
+            for match in USERNAME_MENTION.finditer(text):
+                user_id = self._usernames.get(match.group(1).lower())
+                if user_id is not None:
+                    user_ids.append(user_id)
+
+        sender = message.from_user.id if message.from_user else None
+        rows = []
+        for user_id in dict.fromkeys(user_ids):
+            row = self._users.get(user_id)
+            if row is not None and user_id != sender:
+                rows.append(row)
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._users), "usernames": len(self._usernames)}
+
+# Process-wide AFK index shared by the /afk command and the moderation pipeline
+afk_index = AfkIndex()
@@ -0,0 +1,58 @@
+"""
+Blacklist matching cost against list size: per-word regex loop vs compiled BlacklistMatcher
+
+Usage:
+    python benchmarks/bench_blacklist.py [messages]
+"""
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blacklist import BlacklistMatcher  # noqa: E402
+
+SIZES = (10, 100, 1000, 5000)
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+def per_word_regex(words, text: str) -> bool:
+    """The previous check_blacklist loop: build and run one regex per word"""
+    text = text.lower()
+    for word in words:
+        if re.search(r'\b' + re.escape(word) + r'\b', text):
+            return True
+    return False
+
+def bench(func, texts) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        func(text)
+    return (time.perf_counter() - start) / len(texts)
+
+def main(messages: int):
+    rng = random.Random(42)
+    # Ordinary chat messages: ~40 words, usually with no blacklisted term (the worst case)
+    texts = [" ".join(random_word(rng) for _ in range(40)) for _ in range(messages)]
+
+    print(f"{'words':>6} {'regex loop':>14} {'compiled':>14} {'build':>10} {'speedup':>9}")
+    for size in SIZES:
+        words = [random_word(rng) + "x" for _ in range(size)]
+
+        start = time.perf_counter()
+        matcher = BlacklistMatcher(words)
+        build = time.perf_counter() - start
+
+        before = bench(lambda text: per_word_regex(words, text), texts)
+        after = bench(matcher.search, texts)
+        print(
+            f"{size:>6} {before * 1e6:>11.1f} us {after * 1e6:>11.1f} us "
+            f"{build * 1e3:>7.1f} ms {before / after:>8.1f}x"
+        )
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,128 @@
+"""
+Per-call cost of Database lookups: connection-per-call vs pooled connections,
+the settings cache's hit latency, and burst write throughput: commit-per-write
+vs the group-committing writer
+
+Usage:
+    python benchmarks/bench_database.py [iterations] [burst]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+CHATS = 1000
+
+def seed(db_path: str):
+    """Fill the chats table so lookups hit real rows"""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO chats (chat_id, chat_title) VALUES (?, ?)",
+            [(-100 - i, f"chat {i}") for i in range(CHATS)]
+        )
+    conn.close()
+
+def connection_per_call(db_path: str, chat_id: int):
+    """The previous behaviour: open, query and close for every call"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute("SELECT * FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def commit_per_write(db_path: str, chat_id: int, user_id: int):
+    """The previous write path: own connection and own commit for every write"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        conn.execute("""
+            INSERT INTO warnings (chat_id, user_id, count) VALUES (?, ?, 1)
+            ON CONFLICT(chat_id, user_id) DO UPDATE SET count = count + 1
+        """, (chat_id, user_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+async def bench_before(db_path: str, iterations: int) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    for i in range(iterations):
+        await loop.run_in_executor(None, connection_per_call, db_path, -100 - i % CHATS)
+    return (time.perf_counter() - start) / iterations
+
+async def bench_after(db: Database, iterations: int) -> float:
+    """Uncached reads: _load_chat is get_chat's SQLite path, so every call uses the pool"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        await db._load_chat(-100 - i % CHATS)
+    return (time.perf_counter() - start) / iterations
+
+async def bench_cached(db: Database, iterations: int) -> float:
+    """get_chat once every row is cached: the settings cache's hit latency"""
+    for i in range(CHATS):
+        await db.get_chat(-100 - i)
+    hits = db.chat_cache.hits
+    start = time.perf_counter()
+    for i in range(iterations):
+        await db.get_chat(-100 - i % CHATS)
+    elapsed = time.perf_counter() - start
+    assert db.chat_cache.hits - hits == iterations, "chat cache too small for the benchmark"
+    return elapsed / iterations
+
+async def bench_writes_before(db_path: str, burst: int) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        loop.run_in_executor(None, commit_per_write, db_path, -1, i) for i in range(burst)
+    ))
+    return burst / (time.perf_counter() - start)
+
+async def bench_writes_after(db: Database, burst: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(db.add_warning(-2, i) for i in range(burst)))
+    return burst / (time.perf_counter() - start)
+
+async def main(iterations: int, burst: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db = Database(db_path)
+        db.start()
+        seed(db_path)
+        
+        # Warm up both paths (thread pools, page cache, pooled connections)
+        await bench_before(db_path, 100)
+        await bench_after(db, 100)
+        
+        before = await bench_before(db_path, iterations)
+        after = await bench_after(db, iterations)
+        cached = await bench_cached(db, iterations)
+        
+        writes_before = await bench_writes_before(db_path, burst)
+        batches = db.write_stats["batches"]
+        writes_after = await bench_writes_after(db, burst)
+        batches = db.write_stats["batches"] - batches
+        db.close()
+    
+    print(f"iterations:          {iterations}")
+    print(f"connection per call: {before * 1e6:8.1f} us/call")
+    print(f"pooled connection:   {after * 1e6:8.1f} us/call")
+    print(f"speedup:             {before / after:8.2f}x")
+    print(f"cached get_chat:     {cached * 1e6:8.1f} us/call")
+    print()
+    print(f"write burst:         {burst}")
+    print(f"commit per write:    {writes_before:8.0f} writes/s")
+    print(f"group commit:        {writes_after:8.0f} writes/s ({batches} transactions)")
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    ))
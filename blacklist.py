@@ -0,0 +1,100 @@
+"""
+Compiled blacklist matching
+Finds blacklisted terms with \\b...\\b word-boundary semantics in a single pass over the text
+"""
+import re
+from typing import Iterable, List, Optional
+
+# Up to this many terms a single alternation regex is fastest; beyond it the regex
+# engine tries every alternative at every position, so switch to Aho-Corasick
+REGEX_MAX_WORDS = 64
+
+def _is_word_char(char: str) -> bool:
+    """Same character class as the \\w regex escape"""
+    return char.isalnum() or char == "_"
+
+class BlacklistMatcher:
+    """Matcher over a fixed set of lowercase terms; build once, reuse for every message"""
+
+    def __init__(self, words: Iterable[str]):
+        # Longest first so the alternation regex prefers the most specific term
+        self.words: List[str] = sorted({word.lower() for word in words if word}, key=len, reverse=True)
+        self._regex = None
+        self._goto: List[dict] = []
+        self._fail: List[int] = []
+        self._out: List[tuple] = []
+
+        if len(self.words) <= REGEX_MAX_WORDS:
+            if self.words:
+                self._regex = re.compile(r"\b(?:" + "|".join(map(re.escape, self.words)) + r")\b")
+        else:
+            self._build_automaton()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _build_automaton(self):
+        """Aho-Corasick trie with failure links; _out[node] lists the terms ending there"""
+        goto = [{}]
+        out = [[]]
+        for index, word in enumerate(self.words):
+            node = 0
+            for char in word:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append(index)
+
+        # Breadth-first so every failure target is finished before it is inherited
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                out[child].extend(out[fail[child]])
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(terms) for terms in out]
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first blacklisted term found as a whole word in text, or None"""
+        if not self.words or not text:
+            return None
+        text = text.lower()
+        if self._regex is not None:
+            match = self._regex.search(text)
+            return match.group(0) if match else None
+
+        goto, fail, out, words = self._goto, self._fail, self._out, self.words
+        length = len(text)
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not out[node]:
+                continue
+            for index in out[node]:
+                start = end - len(words[index])
+                # \b before: word-ness changes between text[start-1] and text[start]
+                before = start > 0 and _is_word_char(text[start - 1])
+                if before == _is_word_char(text[start]):
+                    continue
+                after = end < length and _is_word_char(text[end])
+                if after == _is_word_char(text[end - 1]):
+                    continue
+                return words[index]
+        return None
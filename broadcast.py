@@ -0,0 +1,215 @@
+"""
+Broadcast jobs
+Copies one message to every known chat and user with bounded concurrency, checkpointing
+progress to SQLite so a restart resumes where it stopped
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+from pyrogram import Client
+from pyrogram.errors import (
+    ChannelInvalid, ChannelPrivate, ChatForbidden, ChatIdInvalid, ChatWriteForbidden,
+    InputUserDeactivated, PeerIdInvalid, UserBannedInChannel, UserDeactivated,
+    UserDeactivatedBan, UserIsBlocked, UserIsBot, UserKicked
+)
+from pyrogram.types import Message
+from config import Config
+from database import db
+from logger import LOGGER
+from outbox import Priority, lane
+
+# The target can never receive messages again; it is skipped by later broadcasts
+DEAD_ERRORS = (
+    UserIsBlocked, InputUserDeactivated, UserDeactivated, UserDeactivatedBan, UserIsBot,
+    PeerIdInvalid, ChatIdInvalid, ChatWriteForbidden, ChatForbidden, ChannelInvalid,
+    ChannelPrivate, UserBannedInChannel, UserKicked
+)
+
+REPORT_HEADERS = {
+    "running": "📡 Broadcasting...",
+    "done": "✅ Broadcast complete!",
+    "failed": "❌ Broadcast stopped by an error!",
+}
+
+class _Page:
+    """A page of targets; the checkpoint passes its last id once all of them are handled"""
+    __slots__ = ("last_id", "remaining")
+
+    def __init__(self, last_id: int, remaining: int):
+        self.last_id = last_id
+        self.remaining = remaining
+
+class Broadcaster:
+    """Runs broadcast jobs (rows of the broadcasts table) as background tasks
+
+    Targets are read page by page in id order and fed to `concurrency` workers;
+    the actual send rate is set by the outbox, where broadcasts use the BULK lane
+    so they never delay moderation or command replies. The cursor only moves
+    past a page once every target in it is handled, so after a crash at most
+    the pages that were in flight are sent again.
+    """
+
+    def __init__(self, concurrency: int = 20, page_size: int = 500, progress_interval: float = 5):
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self._jobs: Dict[int, asyncio.Task] = {}
+
+    async def start(self, client: Client, source: Message, status: Message) -> int:
+        """Begin broadcasting `source`, reporting progress by editing `status`"""
+        total = await db.count_broadcast_targets()
+        job_id = await db.create_broadcast(
+            source.chat.id, source.id, status.chat.id, status.id, total
+        )
+        self._launch(client, {
+            "id": job_id,
+            "source_chat_id": source.chat.id,
+            "source_message_id": source.id,
+            "status_chat_id": status.chat.id,
+            "status_message_id": status.id,
+            "cursor": None,
+            "total": total,
+            "sent": 0,
+            "failed": 0,
+            "dead": 0,
+        })
+        return job_id
+
+    async def resume(self, client: Client):
+        """Restart every job that was still running at the last shutdown"""
+        for job in await db.get_running_broadcasts():
+            LOGGER.info(f"Resuming broadcast {job['id']} after target {job['cursor']}")
+            self._launch(client, job)
+
+    async def stop(self):
+        """Cancel running jobs; they stay 'running' in the database and resume on next start"""
+        tasks = list(self._jobs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def running(self) -> int:
+        return len(self._jobs)
+
+    def _launch(self, client: Client, job: dict):
+        task = asyncio.ensure_future(self._run(client, job))
+        self._jobs[job["id"]] = task
+        task.add_done_callback(lambda _: self._jobs.pop(job["id"], None))
+
+    async def _run(self, client: Client, job: dict):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        pages = deque()
+        started = time.monotonic()
+        
+        # Read the source once; copy_message would fetch it again for every target
+        try:
+            source = await client.get_messages(job["source_chat_id"], job["source_message_id"])
+            if source is None or source.empty:
+                raise ValueError("source message was deleted")
+        except Exception as e:
+            LOGGER.error(f"Broadcast {job['id']} cannot read its source message: {e}")
+            await db.checkpoint_broadcast(
+                job["id"], job["cursor"], job["sent"], job["failed"], job["dead"], "failed"
+            )
+            await self._report(client, job, started, "failed")
+            return
+
+        async def load():
+            after = job["cursor"]
+            while True:
+                targets = await db.get_broadcast_targets(after, self.page_size)
+                if not targets:
+                    break
+                after = targets[-1]
+                page = _Page(after, len(targets))
+                pages.append(page)
+                for chat_id in targets:
+                    await queue.put((page, chat_id))
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work():
+            with lane(Priority.BULK):
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    page, chat_id = item
+                    await self._send(job, source, chat_id)
+                    page.remaining -= 1
+                    await self._advance(job, pages)
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                await self._report(client, job, started)
+
+        reporter = asyncio.ensure_future(report())
+        tasks = [asyncio.ensure_future(load())]
+        tasks += [asyncio.ensure_future(work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+            state = "done"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOGGER.error(f"Broadcast {job['id']} failed: {e}")
+            for task in tasks:
+                task.cancel()
+            state = "failed"
+        finally:
+            reporter.cancel()
+
+        await db.checkpoint_broadcast(
+            job["id"], job["cursor"], job["sent"], job["failed"], job["dead"], state
+        )
+        await self._report(client, job, started, state)
+        if state == "done":
+            LOGGER.info(
+                f"Broadcast {job['id']} finished: {job['sent']} sent, {job['failed']} failed, "
+                f"{job['dead']} dead in {time.monotonic() - started:.0f}s"
+            )
+
+    async def _send(self, job: dict, source: Message, chat_id: int):
+        try:
+            await source.copy(chat_id)
+            job["sent"] += 1
+        except DEAD_ERRORS as e:
+            job["dead"] += 1
+            await db.mark_chat_dead(chat_id, type(e).__name__)
+        except Exception as e:
+            job["failed"] += 1
+            LOGGER.warning(f"Broadcast {job['id']} to {chat_id} failed: {e}")
+
+    async def _advance(self, job: dict, pages: deque):
+        """Move the checkpoint past every leading page that is fully handled"""
+        cursor: Optional[int] = None
+        while pages and pages[0].remaining == 0:
+            cursor = pages.popleft().last_id
+        if cursor is not None:
+            job["cursor"] = cursor
+            await db.checkpoint_broadcast(job["id"], cursor, job["sent"], job["failed"], job["dead"])
+
+    async def _report(self, client: Client, job: dict, started: float, state: str = "running"):
+        """Edit the status message with the job's progress"""
+        handled = job["sent"] + job["failed"] + job["dead"]
+        elapsed = time.monotonic() - started
+        text = (
+            f"{REPORT_HEADERS[state]}\n"
+            f"📊 Progress: {handled}/{job['total']}\n"
+            f"📤 Sent: {job['sent']}\n"
+            f"❌ Failed: {job['failed']}\n"
+            f"🚫 Unreachable: {job['dead']}\n"
+            f"⏱️ Elapsed: {elapsed:.0f}s"
+        )
+        try:
+            await client.edit_message_text(job["status_chat_id"], job["status_message_id"], text)
+        except Exception as e:
+            LOGGER.warning(f"Broadcast {job['id']} status update failed: {e}")
+
+# Process-wide broadcast runner
+broadcaster = Broadcaster(
+    concurrency=Config.BROADCAST_CONCURRENCY,
+    page_size=Config.BROADCAST_PAGE_SIZE
+)
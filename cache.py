@@ -0,0 +1,98 @@
+"""
+In-memory caches
+Bounded LRU caches with per-entry time-to-live and hit/miss accounting
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Returned by TTLCache.get when a key is absent, so None can be cached as a real value
+MISSING = object()
+
+class TTLCache:
+    """LRU cache whose entries also expire a fixed number of seconds after being stored"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300):
+        """
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid (None = never expires)
+        """
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        # Bumped on every invalidation so in-flight loads can tell their result is stale
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, MISSING, count=False) is not MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """Return the cached value for key, or default if absent or expired"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._data[key]
+            self.expirations += 1
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Any = MISSING):
+        """Store a value; skipped if generation is given and an invalidation happened since
+
+        ttl overrides the cache-wide ttl for this entry (None = never expires).
+        """
+        if generation is not None and generation != self.generation:
+            return
+        if ttl is MISSING:
+            ttl = self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, key: Hashable, value: Any) -> bool:
+        """Replace the value of a live entry, keeping its expiry; False if absent or expired"""
+        entry = self._data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+            return False
+        self._data[key] = (entry[0], value)
+        return True
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -14,6 +14,15 @@ class Config:
     
     # Database (SQLite - no configuration needed, file-based)
     DB_PATH = os.getenv("DB_PATH", "telegram_bot.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # long-lived connections, one per executor thread
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # OFF, NORMAL, FULL or EXTRA
+    DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB per connection
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", "268435456"))  # bytes, 0 disables mmap
+    DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))  # milliseconds
+    DB_WRITE_BATCH_MS = float(os.getenv("DB_WRITE_BATCH_MS", "5"))  # group-commit window
+    DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "256"))  # max writes per commit
+    SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))  # cached chat/welcome rows
+    SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "600"))  # seconds
     
     # Owner and sudo users
     OWNER_ID = int(os.getenv("OWNER_ID", "123456789"))
@@ -23,12 +32,63 @@ class Config:
     # Logging
     LOG_CHANNEL = int(os.getenv("LOG_CHANNEL", "-1001234567890"))
     
-    # Anti-spam settings
-    FLOOD_THRESHOLD = 5  # messages per minute
-    FLOOD_BAN_TIME = 600  # seconds
+    # Anti-flood defaults for chats that have not run /setflood
+    FLOOD_THRESHOLD = int(os.getenv("FLOOD_THRESHOLD", "5"))  # messages...
+    FLOOD_TIMEFRAME = int(os.getenv("FLOOD_TIMEFRAME", "5"))  # ...within this many seconds
+    FLOOD_ACTION = os.getenv("FLOOD_ACTION", "mute")  # mute, kick or ban
+    FLOOD_BAN_TIME = int(os.getenv("FLOOD_BAN_TIME", "600"))  # seconds a mute/ban lasts (0 = forever)
+    
+    # Join-raid protection
+    RAID_THRESHOLD = int(os.getenv("RAID_THRESHOLD", "15"))  # joins within RAID_WINDOW that lock the chat (0 = off)
+    RAID_WINDOW = int(os.getenv("RAID_WINDOW", "10"))  # seconds
+    RAID_ACTION = os.getenv("RAID_ACTION", "kick")  # kick, mute or ban the raiders
+    RAID_COOLDOWN = int(os.getenv("RAID_COOLDOWN", "600"))  # quiet seconds before the chat unlocks
+    RAID_WORKERS = int(os.getenv("RAID_WORKERS", "4"))  # raiders handled at once per chat
+    
+    # Admin roster cache (refreshed from chat-member updates, TTL bounds drift)
+    ADMIN_CACHE_TTL = int(os.getenv("ADMIN_CACHE_TTL", "600"))  # seconds
+    
+    # Outbound rate limits (Telegram: ~30 msg/s overall, 20/min per group, 1/s per private chat)
+    OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))  # calls per second
+    OUTBOX_GROUP_PER_MINUTE = float(os.getenv("OUTBOX_GROUP_PER_MINUTE", "20"))  # messages per group
+    OUTBOX_PRIVATE_RATE = float(os.getenv("OUTBOX_PRIVATE_RATE", "1"))  # messages per second per user
+    OUTBOX_MAX_FLOOD_WAIT = int(os.getenv("OUTBOX_MAX_FLOOD_WAIT", "60"))  # longer waits fail instead of re-queueing
+    OUTBOX_MAX_QUEUE_WAIT = float(os.getenv("OUTBOX_MAX_QUEUE_WAIT", "10"))  # seconds a reply may wait (0 = no limit)
+    UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))  # concurrent update handlers
+    
+    # Outbound HTTP (search commands)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))  # open connections in total
+    HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "10"))  # open connections per host
+    HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))  # seconds DNS answers are cached
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # seconds
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))  # seconds
+    
+    # Search response cache (memory front, optional SQLite tier that survives restarts)
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))  # entries per endpoint in memory
+    SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+    SEARCH_CACHE_DISK_MAX = int(os.getenv("SEARCH_CACHE_DISK_MAX", "50000"))  # rows kept in SQLite
+    
+    # Search upstream protection
+    UPSTREAM_BUDGET = float(os.getenv("UPSTREAM_BUDGET", "4"))  # seconds per lookup, hedge included
+    UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))  # consecutive failures to open
+    UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))  # seconds before a trial request
+    
+    # Offline dictionary for /define, built by tools/build_dictionary.py ("" = remote API only)
+    DICTIONARY_PATH = os.getenv("DICTIONARY_PATH", "")  # path without the .dat/.idx extension
+    
+    # Inline mode
+    INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "5000"))  # built answers kept in memory
+    INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL", "600"))  # seconds a built answer is reused
+    INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))  # seconds Telegram may cache an answer
+    
+    # Broadcasts (the send rate itself is set by the OUTBOX_* limits)
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))  # sends in flight
+    BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))  # targets per checkpoint
     
     # Welcome message settings
     DEFAULT_WELCOME = "Welcome {mention} to {chat}!"
+    WELCOME_WINDOW = float(os.getenv("WELCOME_WINDOW", "3"))  # seconds of joins greeted by one message
+    WELCOME_MAX_MENTIONS = int(os.getenv("WELCOME_MAX_MENTIONS", "10"))  # users named per welcome
     
     # Commands prefix
     COMMAND_PREFIXES = ["/", "!", "."]
@@ -5,429 +5,514 @@ Lightweight replacement for MongoDB with file-based storage
 import sqlite3
 import json
 import asyncio
-from typing import Optional, Dict, List, Any
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterable, List, Any, Tuple
 from logger import LOGGER
-from functools import wraps
+from config import Config
+from cache import TTLCache, MISSING
+from migrations import migrate
+from blacklist import BlacklistMatcher
+from functools import wraps, partial
+
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
 
 def async_db_operation(func):
-    """Decorator to run sync database operations in executor"""
+    """Decorator to run sync database operations in the database's own executor"""
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, self, *args, **kwargs))
+    return wrapper
+
+def async_db_write(func):
+    """Decorator to queue a write on the writer thread; resolves once its batch is committed"""
     @wraps(func)
-    async def wrapper(*args, **kwargs):
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+    async def wrapper(self, *args, **kwargs):
+        return await self._submit_write(partial(func, self, *args, **kwargs))
     return wrapper
 
+def invalidates(cache_name: str):
+    """Decorator to drop the chat's entry from a Database cache once the write has finished"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, chat_id: int, *args, **kwargs):
+            try:
+                return await func(self, chat_id, *args, **kwargs)
+            finally:
+                getattr(self, cache_name).invalidate(chat_id)
+        return wrapper
+    return decorator
+
+def _resolve_future(future: asyncio.Future, result: Any, error: Optional[BaseException]):
+    """Complete a caller's future on its own event loop (skipped if the caller gave up)"""
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
 class Database:
-    _initialized = False  # Class variable to track if we've logged initialization
+    """SQLite storage; construct once, then start() before use and close() on shutdown"""
     
-    def __init__(self, db_path: str = "telegram_bot.db"):
+    def __init__(
+        self,
+        db_path: str = "telegram_bot.db",
+        pool_size: int = 4,
+        synchronous: str = "NORMAL",
+        cache_size: int = -16000,
+        mmap_size: int = 268435456,
+        busy_timeout: int = 5000,
+        write_batch_ms: float = 5,
+        write_batch_size: int = 256,
+        settings_cache_size: int = 10000,
+        settings_cache_ttl: float = 600
+    ):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            pool_size: Number of executor threads, each owning one long-lived connection
+            synchronous: PRAGMA synchronous mode (OFF, NORMAL, FULL or EXTRA)
+            cache_size: PRAGMA cache_size (negative values are KiB, positive are pages)
+            mmap_size: PRAGMA mmap_size in bytes (0 disables memory-mapped I/O)
+            busy_timeout: PRAGMA busy_timeout in milliseconds
+            write_batch_ms: How long the writer waits for more writes before committing a batch
+            write_batch_size: Maximum number of writes committed in one transaction
+            settings_cache_size: Maximum cached rows per settings cache (chats, welcomes)
+            settings_cache_ttl: Seconds a cached settings row stays valid
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+        
         self.db_path = db_path
-        self._init_db()
+        self.pool_size = max(1, int(pool_size))
+        self.pragmas = {
+            "synchronous": synchronous,
+            "cache_size": int(cache_size),
+            "mmap_size": int(mmap_size),
+            "busy_timeout": int(busy_timeout),
+        }
         
-        # Only log once for the entire application
-        if not Database._initialized:
-            LOGGER.info(f"SQLite Database initialized at {db_path}")
-            Database._initialized = True
+        # One connection per executor thread, opened lazily and reused for the process lifetime
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db")
         
-    def _init_db(self):
-        """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        cursor = conn.cursor()
+        # All writes go through one writer thread that group-commits them
+        self.write_batch_interval = max(0.0, write_batch_ms / 1000)
+        self.write_batch_size = max(1, int(write_batch_size))
+        self.write_stats = {"writes": 0, "batches": 0, "failed": 0}
+        self._write_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
         
+        # Read-through caches for rows read on every message/join; writes invalidate them
+        self.chat_cache = TTLCache(settings_cache_size, settings_cache_ttl)
+        self.welcome_cache = TTLCache(settings_cache_size, settings_cache_ttl)
+        # Compiled blacklists only change through add/remove_from_blacklist, so no TTL
+        self.blacklist_cache = TTLCache(settings_cache_size, None)
+    
+    def start(self):
+        """Prepare the schema and start the writer thread (no-op if already started)"""
+        if self._writer.is_alive():
+            return
+        self._init_db()
+        self._writer.start()
+        LOGGER.info(f"SQLite Database initialized at {self.db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection in WAL mode with the configured pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            timeout=self.pragmas["busy_timeout"] / 1000
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+    
+    def _init_db(self):
+        """Bring the schema up to date (a single PRAGMA read when already current)"""
+        conn = self._connect()
         try:
-            # Users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    warned_count INTEGER DEFAULT 0
-                )
-            """)
-            
-            # Chats table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    chat_id INTEGER PRIMARY KEY,
-                    chat_title TEXT,
-                    antiflood BOOLEAN DEFAULT 0,
-                    welcome_enabled BOOLEAN DEFAULT 1,
-                    rules TEXT
-                )
-            """)
-            
-            # Warnings table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS warnings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER,
-                    user_id INTEGER,
-                    count INTEGER DEFAULT 0,
-                    UNIQUE(chat_id, user_id)
-                )
-            """)
-            
-            # Create index for warnings
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_warnings_chat_user 
-                ON warnings(chat_id, user_id)
-            """)
-            
-            # Notes table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS notes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER,
-                    note_name TEXT,
-                    content TEXT,
-                    UNIQUE(chat_id, note_name)
-                )
-            """)
-            
-            # Create index for notes
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_notes_chat 
-                ON notes(chat_id)
-            """)
-            
-            # AFK table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS afk (
-                    user_id INTEGER PRIMARY KEY,
-                    reason TEXT,
-                    afk BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Welcomes table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS welcomes (
-                    chat_id INTEGER PRIMARY KEY,
-                    welcome_text TEXT,
-                    goodbye_text TEXT,
-                    photo TEXT,
-                    welcome_enabled BOOLEAN DEFAULT 1,
-                    goodbye_enabled BOOLEAN DEFAULT 0
-                )
-            """)
-            
-            # Migration: Add new columns if they don't exist
-            try:
-                cursor.execute("ALTER TABLE welcomes ADD COLUMN photo TEXT")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    LOGGER.warning(f"Could not add photo column: {e}")
-            
-            try:
-                cursor.execute("ALTER TABLE welcomes ADD COLUMN welcome_enabled BOOLEAN DEFAULT 1")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    LOGGER.warning(f"Could not add welcome_enabled column: {e}")
-            
-            try:
-                cursor.execute("ALTER TABLE welcomes ADD COLUMN goodbye_enabled BOOLEAN DEFAULT 0")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    LOGGER.warning(f"Could not add goodbye_enabled column: {e}")
-            
-            # Blacklist table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS blacklist (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER,
-                    word TEXT,
-                    UNIQUE(chat_id, word)
-                )
-            """)
+            migrate(conn)
+        finally:
+            conn.close()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the calling executor thread's long-lived connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _submit_write(self, func) -> asyncio.Future:
+        """Queue a write for the writer thread and return a future for its result"""
+        if not self._writer.is_alive():
+            raise RuntimeError("Database writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put((func, future))
+        return future
+    
+    def _writer_loop(self):
+        """Drain the write queue, committing up to write_batch_size writes per transaction"""
+        conn = self._get_connection()
+        running = True
+        while running:
+            item = self._write_queue.get()
+            if item is None:
+                break
             
-            # Create index for blacklist
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_blacklist_chat 
-                ON blacklist(chat_id)
-            """)
+            batch = [item]
+            deadline = time.monotonic() + self.write_batch_interval
+            while len(batch) < self.write_batch_size:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = self._write_queue.get(timeout=timeout) if timeout > 0 else self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
             
+            self._commit_batch(conn, batch)
+    
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list):
+        """Run a batch of writes in one transaction; each write is isolated by a savepoint"""
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, future in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    result = func()
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, result, None))
             conn.commit()
-        finally:
-            conn.close()
+        except sqlite3.Error as e:
+            # The transaction itself failed, so none of the batch is durable
+            LOGGER.error(f"Database write batch of {len(batch)} failed: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(future, None, e) for _, future in batch]
+        
+        self.write_stats["batches"] += 1
+        for future, result, error in outcomes:
+            if error is None:
+                self.write_stats["writes"] += 1
+            else:
+                self.write_stats["failed"] += 1
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve_future, future, result, error)
+            except RuntimeError:
+                pass  # Caller's event loop is already closed
+    
+    async def _read_through(self, cache: TTLCache, chat_id: int, load):
+        """Serve a row from cache, loading and caching it (even if None) on a miss"""
+        row = cache.get(chat_id, MISSING)
+        if row is MISSING:
+            generation = cache.generation
+            row = await load(chat_id)
+            cache.set(chat_id, row, generation)
+        return row
     
-    def _get_connection(self):
-        """Get database connection with proper threading configuration"""
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss/eviction counters for the settings caches"""
+        return {
+            "chats": self.chat_cache.stats(),
+            "welcomes": self.welcome_cache.stats(),
+            "blacklists": self.blacklist_cache.stats(),
+        }
+    
+    def close(self):
+        """Flush queued writes, wait for pending reads, then close every pooled connection"""
+        if self._writer.is_alive():
+            self._write_queue.put(None)
+            self._writer.join()
+        self._executor.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    LOGGER.warning(f"Error closing database connection: {e}")
+            self._connections.clear()
+        LOGGER.info("SQLite Database closed")
     
     # User operations
-    @async_db_operation
+    @async_db_write
     def add_user(self, user_id: int, username: Optional[str] = None, first_name: Optional[str] = None):
         """Add or update user"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO users (user_id, username, first_name, warned_count)
-                VALUES (?, ?, ?, 0)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    username = excluded.username,
-                    first_name = excluded.first_name
-            """, (user_id, username, first_name))
-            conn.commit()
-        finally:
-            conn.close()
+        self._upsert_users(self._get_connection(), [(user_id, username, first_name)])
+    
+    @async_db_write
+    def add_users_many(self, users: Iterable[Tuple[int, Optional[str], Optional[str]]]):
+        """Add or update several users, given as (user_id, username, first_name), in one write"""
+        users = list(users)
+        if users:
+            self._upsert_users(self._get_connection(), users)
+    
+    def _upsert_users(self, conn: sqlite3.Connection, users: List[Tuple[int, Optional[str], Optional[str]]]):
+        conn.executemany("""
+            INSERT INTO users (user_id, username, first_name, warned_count)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name
+        """, users)
     
     @async_db_operation
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user information"""
         conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
     
     # Chat operations
-    @async_db_operation
+    @invalidates("chat_cache")
+    @async_db_write
     def add_chat(self, chat_id: int, chat_title: str):
         """Add or update chat"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO chats (chat_id, chat_title, antiflood, welcome_enabled, rules)
-                VALUES (?, ?, 0, 1, NULL)
-                ON CONFLICT(chat_id) DO UPDATE SET
-                    chat_title = excluded.chat_title
-            """, (chat_id, chat_title))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO chats (chat_id, chat_title, antiflood, welcome_enabled, rules)
+            VALUES (?, ?, 0, 1, NULL)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                chat_title = excluded.chat_title
+        """, (chat_id, chat_title))
+        conn.execute("DELETE FROM dead_chats WHERE chat_id = ?", (chat_id,))
+    
+    async def get_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Get chat information (cached; treat the returned dict as read-only)"""
+        return await self._read_through(self.chat_cache, chat_id, self._load_chat)
     
     @async_db_operation
-    def get_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
-        """Get chat information"""
+    def _load_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Read a chat row from SQLite"""
         conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM chats WHERE chat_id = ?", (chat_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+        row = conn.execute("SELECT * FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+        return dict(row) if row else None
     
-    @async_db_operation
+    @invalidates("chat_cache")
+    @async_db_write
     def update_chat_settings(self, chat_id: int, settings: Dict[str, Any]):
-        """Update chat settings"""
+        """Update chat settings, creating the chat row if it does not exist yet"""
+        # Whitelist of allowed column names to prevent SQL injection
+        allowed_columns = {
+            'chat_title', 'antiflood', 'welcome_enabled', 'rules',
+            'flood_threshold', 'flood_timeframe', 'flood_action', 'flood_duration'
+        }
+        
+        # Build dynamic upsert with validated columns
+        columns = [key for key in settings if key in allowed_columns]
+        if not columns:
+            return  # No valid columns to update
+        
+        values = [chat_id] + [settings[key] for key in columns]
+        query = (
+            f"INSERT INTO chats (chat_id, {', '.join(columns)}) "
+            f"VALUES (?{', ?' * len(columns)}) "
+            f"ON CONFLICT(chat_id) DO UPDATE SET "
+            + ", ".join(f"{key} = excluded.{key}" for key in columns)
+        )
         conn = self._get_connection()
-        cursor = conn.cursor()
+        conn.execute(query, values)
+    
+    async def get_message_context(self, chat_id: int) -> Dict[str, Any]:
+        """Everything the moderation pipeline needs from the database for one group message
         
-        try:
-            # Whitelist of allowed column names to prevent SQL injection
-            allowed_columns = {'chat_title', 'antiflood', 'welcome_enabled', 'rules'}
-            
-            # Build dynamic UPDATE query with validated columns
-            set_clauses = []
-            values = []
-            for key, value in settings.items():
-                if key in allowed_columns:
-                    set_clauses.append(f"{key} = ?")
-                    values.append(value)
-            
-            if not set_clauses:
-                return  # No valid columns to update
-            
-            values.append(chat_id)
-            query = f"UPDATE chats SET {', '.join(set_clauses)} WHERE chat_id = ?"
-            cursor.execute(query, values)
-            conn.commit()
-        finally:
-            conn.close()
+        Returns:
+            Dict with keys:
+                - chat (dict|None): Chat settings row
+                - blacklist (BlacklistMatcher): Compiled blacklist for the chat
+            Both come from cache when possible; a miss costs one executor call.
+        """
+        chat = self.chat_cache.get(chat_id, MISSING)
+        matcher = self.blacklist_cache.get(chat_id)
+        if chat is not MISSING and matcher is not None:
+            return {"chat": chat, "blacklist": matcher}
+        
+        chat_generation = self.chat_cache.generation
+        blacklist_generation = self.blacklist_cache.generation
+        context = await self._load_message_context(chat_id, chat is MISSING, matcher is None)
+        if chat is MISSING:
+            self.chat_cache.set(chat_id, context["chat"], chat_generation)
+        else:
+            context["chat"] = chat
+        if matcher is None:
+            self.blacklist_cache.set(chat_id, context["blacklist"], blacklist_generation)
+        else:
+            context["blacklist"] = matcher
+        return context
     
-    # Warning operations
     @async_db_operation
-    def add_warning(self, chat_id: int, user_id: int):
-        """Add warning to user"""
+    def _load_message_context(self, chat_id: int, load_chat: bool, load_blacklist: bool) -> Dict[str, Any]:
+        """Read chat settings and blacklist (whichever are not cached) in one executor call"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO warnings (chat_id, user_id, count)
-                VALUES (?, ?, 1)
-                ON CONFLICT(chat_id, user_id) DO UPDATE SET
-                    count = count + 1
-            """, (chat_id, user_id))
-            conn.commit()
-        finally:
-            conn.close()
+        chat = None
+        if load_chat:
+            row = conn.execute("SELECT * FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+            chat = dict(row) if row else None
+        
+        blacklist = self._compile_blacklist(conn, chat_id) if load_blacklist else None
+        return {"chat": chat, "blacklist": blacklist}
+    
+    # Warning operations
+    @async_db_write
+    def add_warning(self, chat_id: int, user_id: int) -> int:
+        """Add warning to user; returns their new warning count"""
+        conn = self._get_connection()
+        return conn.execute("""
+            INSERT INTO warnings (chat_id, user_id, count)
+            VALUES (?, ?, 1)
+            ON CONFLICT(chat_id, user_id) DO UPDATE SET
+                count = count + 1
+            RETURNING count
+        """, (chat_id, user_id)).fetchone()[0]
     
     @async_db_operation
     def get_warnings(self, chat_id: int, user_id: int) -> int:
         """Get warning count for user"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT count FROM warnings WHERE chat_id = ? AND user_id = ?", 
-                          (chat_id, user_id))
-            result = cursor.fetchone()
-            return result[0] if result else 0
-        finally:
-            conn.close()
+        result = conn.execute("SELECT count FROM warnings WHERE chat_id = ? AND user_id = ?",
+                              (chat_id, user_id)).fetchone()
+        return result[0] if result else 0
     
-    @async_db_operation
+    @async_db_write
     def reset_warnings(self, chat_id: int, user_id: int):
         """Reset warnings for user"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM warnings WHERE chat_id = ? AND user_id = ?", 
-                          (chat_id, user_id))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("DELETE FROM warnings WHERE chat_id = ? AND user_id = ?",
+                     (chat_id, user_id))
     
     # Notes operations
-    @async_db_operation
+    @async_db_write
     def save_note(self, chat_id: int, note_name: str, note_content: str):
         """Save a note"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO notes (chat_id, note_name, content)
-                VALUES (?, ?, ?)
-                ON CONFLICT(chat_id, note_name) DO UPDATE SET
-                    content = excluded.content
-            """, (chat_id, note_name, note_content))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO notes (chat_id, note_name, content)
+            VALUES (?, ?, ?)
+            ON CONFLICT(chat_id, note_name) DO UPDATE SET
+                content = excluded.content
+        """, (chat_id, note_name, note_content))
     
     @async_db_operation
     def get_note(self, chat_id: int, note_name: str) -> Optional[Dict[str, Any]]:
         """Get a note"""
         conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM notes WHERE chat_id = ? AND note_name = ?", 
-                          (chat_id, note_name))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+        row = conn.execute("SELECT * FROM notes WHERE chat_id = ? AND note_name = ?",
+                           (chat_id, note_name)).fetchone()
+        return dict(row) if row else None
     
     @async_db_operation
     def get_all_notes(self, chat_id: int) -> List[Dict[str, Any]]:
         """Get all notes for a chat"""
         conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM notes WHERE chat_id = ?", (chat_id,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-        finally:
-            conn.close()
+        rows = conn.execute("SELECT * FROM notes WHERE chat_id = ?", (chat_id,)).fetchall()
+        return [dict(row) for row in rows]
     
-    @async_db_operation
+    @async_db_write
     def delete_note(self, chat_id: int, note_name: str):
         """Delete a note"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM notes WHERE chat_id = ? AND note_name = ?", 
-                          (chat_id, note_name))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("DELETE FROM notes WHERE chat_id = ? AND note_name = ?",
+                     (chat_id, note_name))
     
     # AFK operations
-    @async_db_operation
-    def set_afk(self, user_id: int, reason: Optional[str] = None):
+    @async_db_write
+    def set_afk(self, user_id: int, reason: Optional[str] = None,
+                username: Optional[str] = None, first_name: Optional[str] = None):
         """Set user as AFK"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO afk (user_id, reason, afk)
-                VALUES (?, ?, 1)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    reason = excluded.reason,
-                    afk = 1
-            """, (user_id, reason))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO afk (user_id, reason, afk, username, first_name)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                reason = excluded.reason,
+                afk = 1,
+                username = excluded.username,
+                first_name = excluded.first_name
+        """, (user_id, reason, username, first_name))
     
-    @async_db_operation
+    @async_db_write
     def remove_afk(self, user_id: int):
         """Remove AFK status"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM afk WHERE user_id = ?", (user_id,))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("DELETE FROM afk WHERE user_id = ?", (user_id,))
+    
+    @async_db_operation
+    def get_all_afk(self) -> List[Dict[str, Any]]:
+        """Every AFK row (loaded once into the in-memory AFK index)"""
+        conn = self._get_connection()
+        return [dict(row) for row in conn.execute("SELECT * FROM afk WHERE afk = 1")]
     
     @async_db_operation
     def is_afk(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Check if user is AFK"""
         conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM afk WHERE user_id = ? AND afk = 1", (user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+        row = conn.execute("SELECT * FROM afk WHERE user_id = ? AND afk = 1", (user_id,)).fetchone()
+        return dict(row) if row else None
     
     # Blacklist operations
-    @async_db_operation
+    @invalidates("blacklist_cache")
+    @async_db_write
     def add_to_blacklist(self, chat_id: int, word: str):
         """Add word to blacklist"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO blacklist (chat_id, word)
-                VALUES (?, ?)
-            """, (chat_id, word))
-            conn.commit()
-        except sqlite3.IntegrityError:
-            pass  # Word already in blacklist
-        finally:
-            conn.close()
+        # OR IGNORE: word already in blacklist
+        conn.execute("""
+            INSERT OR IGNORE INTO blacklist (chat_id, word)
+            VALUES (?, ?)
+        """, (chat_id, word))
     
-    @async_db_operation
+    @invalidates("blacklist_cache")
+    @async_db_write
     def remove_from_blacklist(self, chat_id: int, word: str):
         """Remove word from blacklist"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM blacklist WHERE chat_id = ? AND word = ?", 
-                          (chat_id, word))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("DELETE FROM blacklist WHERE chat_id = ? AND word = ?",
+                     (chat_id, word))
     
     @async_db_operation
     def get_blacklist(self, chat_id: int) -> List[str]:
         """Get all blacklisted words for a chat"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT word FROM blacklist WHERE chat_id = ?", (chat_id,))
-            rows = cursor.fetchall()
-            return [row[0] for row in rows]
-        finally:
-            conn.close()
+        rows = conn.execute("SELECT word FROM blacklist WHERE chat_id = ?", (chat_id,)).fetchall()
+        return [row[0] for row in rows]
+    
+    async def get_blacklist_matcher(self, chat_id: int) -> BlacklistMatcher:
+        """Get the chat's compiled blacklist, rebuilt only after the blacklist changes"""
+        return await self._read_through(self.blacklist_cache, chat_id, self._load_blacklist_matcher)
     
-    # Welcome message operations
     @async_db_operation
-    def get_welcome(self, chat_id: int) -> Optional[Dict[str, Any]]:
-        """Get welcome message settings for a chat
+    def _load_blacklist_matcher(self, chat_id: int) -> BlacklistMatcher:
+        """Read and compile a chat's blacklist (off the event loop)"""
+        return self._compile_blacklist(self._get_connection(), chat_id)
+    
+    def _compile_blacklist(self, conn: sqlite3.Connection, chat_id: int) -> BlacklistMatcher:
+        """Build a matcher from the chat's blacklist rows"""
+        rows = conn.execute("SELECT word FROM blacklist WHERE chat_id = ?", (chat_id,)).fetchall()
+        return BlacklistMatcher(row[0] for row in rows)
+    
+    # Welcome message operations
+    async def get_welcome(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Get welcome message settings for a chat (cached; treat the returned dict as read-only)
         
         Returns:
             Optional[Dict]: Dictionary with keys:
@@ -439,72 +524,212 @@ class Database:
                 - goodbye_enabled (int): 1 if enabled, 0 if disabled
             Returns None if no settings exist for this chat.
         """
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM welcomes WHERE chat_id = ?", (chat_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+        return await self._read_through(self.welcome_cache, chat_id, self._load_welcome)
     
     @async_db_operation
+    def _load_welcome(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Read a welcome settings row from SQLite"""
+        conn = self._get_connection()
+        row = conn.execute("SELECT * FROM welcomes WHERE chat_id = ?", (chat_id,)).fetchone()
+        return dict(row) if row else None
+    
+    @invalidates("welcome_cache")
+    @async_db_write
     def set_welcome(self, chat_id: int, welcome_text: str, photo: Optional[str] = None):
         """Set welcome message for a chat (does not change enabled state)"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO welcomes (chat_id, welcome_text, photo)
-                VALUES (?, ?, ?)
-                ON CONFLICT(chat_id) DO UPDATE SET
-                    welcome_text = excluded.welcome_text,
-                    photo = excluded.photo
-            """, (chat_id, welcome_text, photo))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO welcomes (chat_id, welcome_text, photo)
+            VALUES (?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                welcome_text = excluded.welcome_text,
+                photo = excluded.photo
+        """, (chat_id, welcome_text, photo))
     
-    @async_db_operation
+    @invalidates("welcome_cache")
+    @async_db_write
     def set_goodbye(self, chat_id: int, goodbye_text: str):
         """Set goodbye message for a chat (does not change enabled state)"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO welcomes (chat_id, goodbye_text)
-                VALUES (?, ?)
-                ON CONFLICT(chat_id) DO UPDATE SET
-                    goodbye_text = excluded.goodbye_text
-            """, (chat_id, goodbye_text))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO welcomes (chat_id, goodbye_text)
+            VALUES (?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                goodbye_text = excluded.goodbye_text
+        """, (chat_id, goodbye_text))
     
-    @async_db_operation
+    @invalidates("welcome_cache")
+    @async_db_write
     def delete_welcome(self, chat_id: int):
         """Delete welcome message for a chat"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM welcomes WHERE chat_id = ?", (chat_id,))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("DELETE FROM welcomes WHERE chat_id = ?", (chat_id,))
     
-    @async_db_operation
+    @invalidates("welcome_cache")
+    @async_db_write
     def toggle_welcome(self, chat_id: int, enabled: bool):
         """Toggle welcome messages on/off"""
         conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO welcomes (chat_id, welcome_enabled)
-                VALUES (?, ?)
-                ON CONFLICT(chat_id) DO UPDATE SET
-                    welcome_enabled = excluded.welcome_enabled
-            """, (chat_id, 1 if enabled else 0))
-            conn.commit()
-        finally:
-            conn.close()
+        conn.execute("""
+            INSERT INTO welcomes (chat_id, welcome_enabled)
+            VALUES (?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                welcome_enabled = excluded.welcome_enabled
+        """, (chat_id, 1 if enabled else 0))
+    
+    # Broadcast operations
+    @async_db_write
+    def create_broadcast(
+        self,
+        source_chat_id: int,
+        source_message_id: int,
+        status_chat_id: int,
+        status_message_id: int,
+        total: int
+    ) -> int:
+        """Record a new running broadcast job and return its id"""
+        conn = self._get_connection()
+        cursor = conn.execute("""
+            INSERT INTO broadcasts (source_chat_id, source_message_id, status_chat_id,
+                                    status_message_id, total, started_at)
+            VALUES (?, ?, ?, ?, ?, strftime('%s', 'now'))
+        """, (source_chat_id, source_message_id, status_chat_id, status_message_id, total))
+        return cursor.lastrowid
+    
+    @async_db_write
+    def checkpoint_broadcast(
+        self,
+        broadcast_id: int,
+        cursor: int,
+        sent: int,
+        failed: int,
+        dead: int,
+        state: str = "running"
+    ):
+        """Persist a job's progress; every target id <= cursor has been handled"""
+        conn = self._get_connection()
+        conn.execute("""
+            UPDATE broadcasts
+            SET cursor = ?, sent = ?, failed = ?, dead = ?, state = ?,
+                finished_at = CASE WHEN ? = 'running' THEN NULL ELSE strftime('%s', 'now') END
+            WHERE id = ?
+        """, (cursor, sent, failed, dead, state, state, broadcast_id))
+    
+    @async_db_operation
+    def get_running_broadcasts(self) -> List[Dict[str, Any]]:
+        """Jobs that were still running when the bot last stopped"""
+        conn = self._get_connection()
+        rows = conn.execute("SELECT * FROM broadcasts WHERE state = 'running' ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+    
+    @async_db_operation
+    def count_broadcast_targets(self) -> int:
+        """Number of known chats and users that are not marked dead"""
+        conn = self._get_connection()
+        return conn.execute("""
+            SELECT COUNT(*) FROM (SELECT chat_id AS id FROM chats UNION SELECT user_id FROM users)
+            WHERE id NOT IN (SELECT chat_id FROM dead_chats)
+        """).fetchone()[0]
+    
+    @async_db_operation
+    def get_broadcast_targets(self, after: Optional[int], limit: int) -> List[int]:
+        """Next page of live chat/user ids in ascending order (keyset pagination)"""
+        if after is None:
+            after = -(1 << 63)
+        conn = self._get_connection()
+        rows = conn.execute("""
+            SELECT id FROM (
+                SELECT chat_id AS id FROM chats WHERE chat_id > ?
+                UNION
+                SELECT user_id FROM users WHERE user_id > ?
+            )
+            WHERE id NOT IN (SELECT chat_id FROM dead_chats)
+            ORDER BY id
+            LIMIT ?
+        """, (after, after, limit)).fetchall()
+        return [row[0] for row in rows]
+    
+    @async_db_write
+    def mark_chat_dead(self, chat_id: int, reason: str):
+        """Skip a chat in future broadcasts (blocked, deleted, kicked, ...)"""
+        conn = self._get_connection()
+        conn.execute("""
+            INSERT OR REPLACE INTO dead_chats (chat_id, reason, marked_at)
+            VALUES (?, ?, strftime('%s', 'now'))
+        """, (chat_id, reason))
+    
+    @async_db_write
+    def mark_chat_alive(self, chat_id: int):
+        """Make a chat a broadcast target again (e.g. a user who blocked the bot sent /start)"""
+        conn = self._get_connection()
+        conn.execute("DELETE FROM dead_chats WHERE chat_id = ?", (chat_id,))
+    
+    # Search cache operations
+    @async_db_operation
+    def get_search_cache(self, endpoint: str, key: str) -> Optional[Dict[str, Any]]:
+        """Unexpired cached response (status, body, expires_at) or None"""
+        conn = self._get_connection()
+        row = conn.execute("""
+            SELECT status, body, expires_at FROM search_cache
+            WHERE endpoint = ? AND key = ? AND expires_at > ?
+        """, (endpoint, key, time.time())).fetchone()
+        return dict(row) if row else None
+    
+    @async_db_write
+    def set_search_cache(self, endpoint: str, key: str, status: int, body: Optional[str], expires_at: float):
+        """Store or replace a cached response"""
+        conn = self._get_connection()
+        conn.execute("""
+            INSERT OR REPLACE INTO search_cache (endpoint, key, status, body, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (endpoint, key, status, body, expires_at))
+    
+    @async_db_write
+    def prune_search_cache(self, max_rows: int) -> int:
+        """Drop expired responses, then the soonest-expiring ones beyond max_rows; returns rows removed"""
+        conn = self._get_connection()
+        removed = conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - max_rows
+        if excess > 0:
+            removed += conn.execute("""
+                DELETE FROM search_cache WHERE (endpoint, key) IN (
+                    SELECT endpoint, key FROM search_cache ORDER BY expires_at LIMIT ?
+                )
+            """, (excess,)).rowcount
+        return removed
+    
+    # Raid lockdown operations
+    @async_db_write
+    def save_lockdown(self, chat_id: int, permissions: str, until: float):
+        """Record (or extend) a raid lockdown; permissions is the JSON to restore on unlock"""
+        conn = self._get_connection()
+        conn.execute("""
+            INSERT INTO raid_lockdowns (chat_id, permissions, until, started_at)
+            VALUES (?, ?, ?, strftime('%s', 'now'))
+            ON CONFLICT(chat_id) DO UPDATE SET until = excluded.until
+        """, (chat_id, permissions, until))
+    
+    @async_db_write
+    def end_lockdown(self, chat_id: int):
+        conn = self._get_connection()
+        conn.execute("DELETE FROM raid_lockdowns WHERE chat_id = ?", (chat_id,))
+    
+    @async_db_operation
+    def get_lockdowns(self) -> List[Dict[str, Any]]:
+        """Lockdowns still in force at the last shutdown"""
+        conn = self._get_connection()
+        return [dict(row) for row in conn.execute("SELECT * FROM raid_lockdowns")]
+
+# Process-wide database service shared by main.py and every plugin
+db = Database(
+    Config.DB_PATH,
+    pool_size=Config.DB_POOL_SIZE,
+    synchronous=Config.DB_SYNCHRONOUS,
+    cache_size=Config.DB_CACHE_SIZE,
+    mmap_size=Config.DB_MMAP_SIZE,
+    busy_timeout=Config.DB_BUSY_TIMEOUT,
+    write_batch_ms=Config.DB_WRITE_BATCH_MS,
+    write_batch_size=Config.DB_WRITE_BATCH_SIZE,
+    settings_cache_size=Config.SETTINGS_CACHE_SIZE,
+    settings_cache_ttl=Config.SETTINGS_CACHE_TTL
+)
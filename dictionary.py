@@ -0,0 +1,132 @@
+"""
+Offline dictionary
+Read-only word lookups over two memory-mapped files built by tools/build_dictionary.py:
+
+    <path>.dat  sorted lines of "word<TAB>entry JSON<LF>", keyed by the lowercase word
+    <path>.idx  header, then the byte offset of every line as little-endian uint64
+
+A lookup binary-searches the offsets and compares keys in place, so nothing is loaded
+into RAM up front and the OS page cache keeps the hot pages resident.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, Optional, Tuple
+from config import Config
+from logger import LOGGER
+
+INDEX_MAGIC = b"TGDICT1\0"
+INDEX_HEADER = struct.Struct("<8sQ")  # magic, entry count
+OFFSET = struct.Struct("<Q")
+
+def dictionary_key(word: str) -> bytes:
+    return word.strip().lower().encode("utf-8")
+
+def write_dictionary(entries: Iterable[Tuple[str, Dict[str, Any]]], path: str) -> int:
+    """
+    Write the .dat and .idx files for `path`
+
+    Args:
+        entries: (word, entry) pairs, entry shaped like a dictionaryapi.dev entry;
+            later duplicates of a word replace earlier ones
+        path: Output path without extension
+
+    Returns:
+        int: Number of words written
+    """
+    lines = {}
+    for word, entry in entries:
+        key = dictionary_key(word)
+        if key and b"\t" not in key and b"\n" not in key:
+            lines[key] = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    # Write under temporary names so a running bot never maps half-written files
+    with open(path + ".dat.tmp", "wb") as data, open(path + ".idx.tmp", "wb") as index:
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, len(lines)))
+        offset = 0
+        for key in sorted(lines):
+            line = key + b"\t" + lines[key] + b"\n"
+            index.write(OFFSET.pack(offset))
+            data.write(line)
+            offset += len(line)
+    os.replace(path + ".dat.tmp", path + ".dat")
+    os.replace(path + ".idx.tmp", path + ".idx")
+    return len(lines)
+
+class OfflineDictionary:
+    """Memory-mapped word index; open() once at startup, lookup() from any coroutine"""
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: Optional[mmap.mmap] = None
+        self._index: Optional[mmap.mmap] = None
+        self._offsets: Optional[memoryview] = None
+
+    @property
+    def available(self) -> bool:
+        return self._data is not None
+
+    def open(self) -> bool:
+        """Map the files if configured and present; returns whether lookups are available"""
+        if not self.path or self.available:
+            return self.available
+        try:
+            with open(self.path + ".dat", "rb") as data, open(self.path + ".idx", "rb") as index:
+                self._index = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count = INDEX_HEADER.unpack_from(self._index)
+                if magic != INDEX_MAGIC:
+                    raise ValueError(f"{self.path}.idx is not a dictionary index")
+                if sys.byteorder != "little":
+                    raise ValueError("the offsets are little-endian; this host is not")
+                if count:
+                    self._data = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+                    # Offsets are read straight from the mapping, never copied
+                    self._offsets = memoryview(self._index)[INDEX_HEADER.size:].cast("Q")
+            self.count = count
+            LOGGER.info(f"Offline dictionary loaded: {count} words from {self.path}")
+        except (OSError, ValueError, struct.error) as e:
+            LOGGER.warning(f"Offline dictionary unavailable ({self.path}): {e}")
+            self.close()
+        return self.available
+
+    def close(self):
+        if self._offsets is not None:
+            self._offsets.release()
+            self._offsets = None
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._data = self._index = None
+
+    def lookup(self, word: str) -> Optional[Dict[str, Any]]:
+        """The entry for a word, or None if it is not in the dictionary"""
+        if self._data is None:
+            return None
+        key = dictionary_key(word)
+        data, offsets = self._data, self._offsets
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = offsets[middle]
+            current = data[start:data.find(b"\t", start)]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                body = start + len(key) + 1
+                self.hits += 1
+                return json.loads(data[body:data.find(b"\n", body)])
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"words": self.count, "hits": self.hits, "misses": self.misses}
+
+# Process-wide offline dictionary; disabled unless DICTIONARY_PATH is set
+offline_dictionary = OfflineDictionary(Config.DICTIONARY_PATH)
@@ -0,0 +1,130 @@
+"""
+Shared outbound HTTP client
+One pooled aiohttp session for every plugin: keep-alive connections, per-host limits,
+cached DNS and timeouts, with per-endpoint latency statistics
+"""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import aiohttp
+from config import Config
+
+class LatencyStats:
+    """Request count, errors and a window of recent latencies for one endpoint"""
+    __slots__ = ("requests", "errors", "total", "recent")
+
+    def __init__(self, window: int = 512):
+        self.requests = 0
+        self.errors = 0
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float, ok: bool):
+        self.requests += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at the given fraction of the recent window, or None if empty"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg": self.total / self.requests if self.requests else 0.0,
+            "p50": self.percentile(0.50) or 0.0,
+            "p95": self.percentile(0.95) or 0.0,
+        }
+
+class HttpClient:
+    """Process-wide aiohttp session; start() when the bot starts and close() when it stops"""
+
+    def __init__(
+        self,
+        pool_size: int = 100,
+        pool_per_host: int = 10,
+        dns_ttl: int = 300,
+        connect_timeout: float = 5,
+        read_timeout: float = 10
+    ):
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=connect_timeout + read_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, LatencyStats] = {}
+
+    async def start(self):
+        """Open the pooled session (no-op if already open)"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            enable_cleanup_closed=True
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP client is not started")
+        return self._session
+
+    async def get_json(self, endpoint: str, url: str, **kwargs) -> Tuple[int, Any]:
+        """
+        GET a URL and decode a JSON body
+
+        Args:
+            endpoint: Name the request's latency is recorded under (e.g. "wiki")
+
+        Returns:
+            tuple: (status: int, data) where data is None unless the status is 200
+        """
+        if self._session is None:
+            await self.start()
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = LatencyStats()
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with self.session.get(url, **kwargs) as response:
+                data = await response.json(content_type=None) if response.status == 200 else None
+                ok = response.status < 500
+                return response.status, data
+        finally:
+            stats.record(time.perf_counter() - started, ok)
+
+    def latency(self, endpoint: str) -> Optional[LatencyStats]:
+        return self._stats.get(endpoint)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint request counts, error counts and latency (seconds)"""
+        return {endpoint: stats.snapshot() for endpoint, stats in self._stats.items()}
+
+# Process-wide HTTP client shared by every plugin
+http_client = HttpClient(
+    pool_size=Config.HTTP_POOL_SIZE,
+    pool_per_host=Config.HTTP_POOL_PER_HOST,
+    dns_ttl=Config.HTTP_DNS_TTL,
+    connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+    read_timeout=Config.HTTP_READ_TIMEOUT
+)
@@ -3,26 +3,39 @@ Advanced Telegram Bot
 Main bot initialization and command handlers
 """
 
-from pyrogram import Client, filters, enums
+from pyrogram import Client, filters, enums, idle
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
 from config import Config
 from plugins import admin, info, utilities, antiflood, welcome
-from database import Database
+from database import db
+from outbox import ScheduledClient, outbox
+from broadcast import broadcaster
+from http_client import http_client
+from dictionary import offline_dictionary
+from afk_index import afk_index
+from plugins.antiflood import raid_guard
 from logger import LOGGER
 import asyncio
 
 class TelegramBot:
     def __init__(self):
-        self.app = Client(
+        # Sends are paced and prioritised by the outbox scheduler
+        self.app = ScheduledClient(
             "my_bot",
             api_id=Config.API_ID,
             api_hash=Config.API_HASH,
             bot_token=Config.BOT_TOKEN,
-            plugins=dict(root="plugins")
+            plugins=dict(root="plugins"),
+            workers=Config.UPDATE_WORKERS
         )
-        self.db = Database(Config.DB_PATH)
+        self.db = db
         
     async def start(self):
+        # Schema work happens once here, before any handler can touch the database
+        self.db.start()
+        await afk_index.load()
+        await http_client.start()
+        offline_dictionary.open()
         await self.app.start()
         me = await self.app.get_me()
         LOGGER.info(f"Bot Started as @{me.username}")
@@ -30,6 +43,10 @@ class TelegramBot:
         # Register bot commands for autocomplete in groups
         await self._register_commands()
         
+        # Pick up broadcasts and raid lockdowns interrupted by the last shutdown
+        await broadcaster.resume(self.app)
+        await raid_guard.resume(self.app)
+        
     async def _register_commands(self):
         """Register bot commands for Telegram autocomplete feature"""
         commands = [
@@ -77,6 +94,7 @@ class TelegramBot:
             # Protection commands
             BotCommand("antiflood", "Toggle anti-flood"),
             BotCommand("setflood", "Configure flood"),
+            BotCommand("endraid", "End a raid lockdown"),
             BotCommand("blacklist", "Blacklist word"),
             BotCommand("welcome", "Toggle welcome"),
             BotCommand("setwelcome", "Set welcome message"),
@@ -90,9 +108,22 @@ class TelegramBot:
             LOGGER.warning(f"Failed to register commands (non-critical): {e}")
         
     async def stop(self):
+        await broadcaster.stop()
+        await raid_guard.stop()
         await self.app.stop()
+        await outbox.stop()
+        await http_client.close()
+        offline_dictionary.close()
+        self.db.close()
         LOGGER.info("Bot Stopped")
 
-if __name__ == "__main__":
+async def main():
     bot = TelegramBot()
-    bot.app.run()
\ No newline at end of file
+    await bot.start()
+    try:
+        await idle()
+    finally:
+        await bot.stop()
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
\ No newline at end of file
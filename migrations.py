@@ -0,0 +1,257 @@
+"""
+Versioned schema migrations
+The schema version lives in PRAGMA user_version; each step runs in its own transaction
+"""
+import sqlite3
+import time
+from typing import Callable, List, Optional, Tuple
+from logger import LOGGER
+
+class Migration:
+    """One schema step
+
+    apply runs inside a single transaction together with the user_version bump, so it
+    must stay cheap (CREATE, ADD COLUMN with a constant default, small UPDATEs).
+    Work proportional to table size belongs in backfill, which is called repeatedly as
+    backfill(conn, last_rowid, batch_size) -> new last_rowid (None when finished), each
+    call in its own short transaction so writers are never locked out for long. apply
+    and backfill must be idempotent: if the process dies mid-backfill the step reruns.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        name: str,
+        apply: Callable[[sqlite3.Connection], None],
+        backfill: Optional[Callable[[sqlite3.Connection, int, int], Optional[int]]] = None
+    ):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.backfill = backfill
+
+def table_columns(conn: sqlite3.Connection, table: str) -> set:
+    """Names of the columns a table currently has"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    if column not in table_columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _initial_schema(conn: sqlite3.Connection):
+    """Version 1: the schema as it stood before versioning
+
+    Databases created by older releases have user_version 0 but may already contain
+    these tables, hence IF NOT EXISTS and the column checks for welcomes.
+    """
+    # Users table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            warned_count INTEGER DEFAULT 0
+        )
+    """)
+
+    # Chats table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            chat_title TEXT,
+            antiflood BOOLEAN DEFAULT 0,
+            welcome_enabled BOOLEAN DEFAULT 1,
+            rules TEXT
+        )
+    """)
+
+    # Warnings table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS warnings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            user_id INTEGER,
+            count INTEGER DEFAULT 0,
+            UNIQUE(chat_id, user_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_warnings_chat_user ON warnings(chat_id, user_id)")
+
+    # Notes table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            note_name TEXT,
+            content TEXT,
+            UNIQUE(chat_id, note_name)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_chat ON notes(chat_id)")
+
+    # AFK table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS afk (
+            user_id INTEGER PRIMARY KEY,
+            reason TEXT,
+            afk BOOLEAN DEFAULT 1
+        )
+    """)
+
+    # Welcomes table (older databases may lack the later columns)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS welcomes (
+            chat_id INTEGER PRIMARY KEY,
+            welcome_text TEXT,
+            goodbye_text TEXT,
+            photo TEXT,
+            welcome_enabled BOOLEAN DEFAULT 1,
+            goodbye_enabled BOOLEAN DEFAULT 0
+        )
+    """)
+    add_column(conn, "welcomes", "photo", "TEXT")
+    add_column(conn, "welcomes", "welcome_enabled", "BOOLEAN DEFAULT 1")
+    add_column(conn, "welcomes", "goodbye_enabled", "BOOLEAN DEFAULT 0")
+
+    # Blacklist table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            word TEXT,
+            UNIQUE(chat_id, word)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blacklist_chat ON blacklist(chat_id)")
+
+def _flood_settings(conn: sqlite3.Connection):
+    """Version 2: per-chat flood limits (NULL columns fall back to the Config defaults)"""
+    add_column(conn, "chats", "flood_threshold", "INTEGER")
+    add_column(conn, "chats", "flood_timeframe", "INTEGER")
+    add_column(conn, "chats", "flood_action", "TEXT")
+    add_column(conn, "chats", "flood_duration", "INTEGER")
+
+def _broadcasts(conn: sqlite3.Connection):
+    """Version 3: resumable broadcast jobs and chats that can no longer be messaged"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_chat_id INTEGER NOT NULL,
+            source_message_id INTEGER NOT NULL,
+            status_chat_id INTEGER,
+            status_message_id INTEGER,
+            state TEXT NOT NULL DEFAULT 'running',
+            cursor INTEGER,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            dead INTEGER DEFAULT 0,
+            started_at INTEGER,
+            finished_at INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dead_chats (
+            chat_id INTEGER PRIMARY KEY,
+            reason TEXT,
+            marked_at INTEGER
+        )
+    """)
+
+def _search_cache(conn: sqlite3.Connection):
+    """Version 4: persistent second tier of the search response cache"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_cache (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            body TEXT,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (endpoint, key)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_expires ON search_cache(expires_at)")
+
+def _afk_names(conn: sqlite3.Connection):
+    """Version 5: names on AFK rows, so @username mentions resolve without an API call"""
+    add_column(conn, "afk", "username", "TEXT")
+    add_column(conn, "afk", "first_name", "TEXT")
+
+def _raid_lockdowns(conn: sqlite3.Connection):
+    """Version 6: chats locked against a join raid, with the permissions to restore"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS raid_lockdowns (
+            chat_id INTEGER PRIMARY KEY,
+            permissions TEXT NOT NULL,
+            until REAL NOT NULL,
+            started_at INTEGER
+        )
+    """)
+
+# Ordered by version; never edit a released step, append a new one instead
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial schema", _initial_schema),
+    Migration(2, "per-chat flood settings", _flood_settings),
+    Migration(3, "broadcast jobs", _broadcasts),
+    Migration(4, "search cache", _search_cache),
+    Migration(5, "AFK names", _afk_names),
+    Migration(6, "raid lockdowns", _raid_lockdowns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def _run_backfill(conn: sqlite3.Connection, migration: Migration, batch_size: int) -> int:
+    """Run a migration's backfill in short transactions; returns the number of batches"""
+    last_rowid = 0
+    batches = 0
+    while last_rowid is not None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last_rowid = migration.backfill(conn, last_rowid, batch_size)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        batches += 1
+    return batches
+
+def migrate(conn: sqlite3.Connection, batch_size: int = 5000) -> List[Tuple[int, str, float]]:
+    """Apply every pending migration in order
+
+    Returns:
+        List of (version, name, seconds) for the steps that ran; empty when the
+        database was already current (which costs a single PRAGMA read).
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration.apply(conn)
+            if migration.backfill is None:
+                conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            LOGGER.error(f"Migration {migration.version} ({migration.name}) failed, rolled back")
+            raise
+
+        if migration.backfill is not None:
+            batches = _run_backfill(conn, migration, batch_size)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+            LOGGER.info(f"Migration {migration.version} backfilled in {batches} batches")
+
+        elapsed = time.perf_counter() - started
+        applied.append((migration.version, migration.name, elapsed))
+        LOGGER.info(f"Applied migration {migration.version} ({migration.name}) in {elapsed * 1000:.1f} ms")
+
+    return applied
@@ -0,0 +1,371 @@
+"""
+Outbound API scheduler
+Every send-like Telegram call is paced through token buckets modeled on the Bot API
+limits (about 30 messages/s overall, 20/min per group, 1/s per private chat) and
+granted in priority order, so bursts queue up locally instead of earning FloodWaits.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional, Tuple
+from pyrogram import Client, raw
+from pyrogram.errors import FloodWait, SlowmodeWait
+from pyrogram.session import Session
+from config import Config
+from logger import LOGGER
+
+class Priority(IntEnum):
+    """Scheduler lanes; a lower value is always granted first"""
+    MODERATION = 0  # bans, mutes, deletions and the notices that go with them
+    NORMAL = 1  # command replies
+    BULK = 2  # broadcasts and other background sends
+
+# Methods that put a message into a chat: paced per chat and globally
+MESSAGE_METHODS = (
+    raw.functions.messages.SendMessage,
+    raw.functions.messages.SendMedia,
+    raw.functions.messages.SendMultiMedia,
+    raw.functions.messages.ForwardMessages,
+    raw.functions.messages.SendInlineBotResult,
+    raw.functions.messages.EditMessage,
+)
+
+# Moderation actions: paced globally only, granted ahead of ordinary replies
+MODERATION_METHODS = (
+    raw.functions.channels.EditBanned,
+    raw.functions.channels.EditAdmin,
+    raw.functions.channels.DeleteMessages,
+    raw.functions.channels.DeleteParticipantHistory,
+    raw.functions.messages.DeleteMessages,
+    raw.functions.messages.DeleteChatUser,
+    raw.functions.messages.EditChatDefaultBannedRights,
+    raw.functions.messages.UpdatePinnedMessage,
+)
+
+# Everything else (reads, callback/inline answers, ...) is passed straight through
+
+# Times a call is re-queued after a FloodWait before the error reaches the caller
+FLOOD_RETRIES = 3
+
+class OutboxBusy(Exception):
+    """A call would wait longer than its lane allows for a grant; it was not sent"""
+
+_lane_override: ContextVar[Optional[Priority]] = ContextVar("outbox_lane", default=None)
+
+@contextmanager
+def lane(priority: Priority):
+    """Send every scheduled call made inside the block through the given lane"""
+    token = _lane_override.set(priority)
+    try:
+        yield
+    finally:
+        _lane_override.reset(token)
+
+class TokenBucket:
+    """rate tokens per second up to capacity; block() empties it until a deadline"""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until: float):
+        """Honor a FloodWait: nothing before `until`, then one call and the normal refill"""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 1
+        self.updated = self.blocked_until
+
+class Route:
+    """How one raw call is scheduled"""
+    __slots__ = ("priority", "chat", "private")
+
+    def __init__(self, priority: Priority, chat: Optional[int], private: bool):
+        self.priority = priority
+        self.chat = chat  # peer id whose bucket applies, or None for global-only pacing
+        self.private = private
+
+class _Ticket:
+    __slots__ = ("future", "route", "queued_at")
+
+    def __init__(self, future: asyncio.Future, route: Route, queued_at: float):
+        self.future = future
+        self.route = route
+        self.queued_at = queued_at
+
+def _peer_id(peer) -> Tuple[Optional[int], bool]:
+    """Bot API style id of an input peer/channel, and whether it is a private chat"""
+    if getattr(peer, "channel_id", None) is not None:
+        return -1000000000000 - peer.channel_id, False
+    if getattr(peer, "chat_id", None) is not None:
+        return -peer.chat_id, False
+    if getattr(peer, "user_id", None) is not None:
+        return peer.user_id, True
+    return None, False
+
+class SendScheduler:
+    """Priority queue of pending sends, granted against global and per-chat token buckets
+
+    A single dispatcher task hands out grants: it walks the lanes from highest
+    priority down and releases the first waiting call whose chat bucket has a
+    token, so a chat that is over its limit never holds up other chats.
+    """
+
+    # How far into a lane the dispatcher looks for a chat that is ready
+    SCAN_DEPTH = 256
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        group_per_minute: float = 20,
+        private_rate: float = 1,
+        group_burst: float = 5,
+        private_burst: float = 2,
+        max_flood_wait: float = 60,
+        max_normal_wait: Optional[float] = 10,
+        max_chats: int = 10000
+    ):
+        self.group_rate = group_per_minute / 60
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.max_flood_wait = max_flood_wait
+        # NORMAL-lane calls come from update handlers, which hold one of Pyrogram's fixed
+        # workers while they wait; past this many seconds the call is dropped instead
+        self.max_normal_wait = max_normal_wait
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._lanes: List[Deque[_Ticket]] = [deque() for _ in Priority]
+        self._queued: Dict[int, int] = {}  # chat -> calls waiting for its bucket
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = 0
+        self.flood_waits = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=1024)
+
+    def route(self, query) -> Optional[Route]:
+        """Scheduling route for a raw call, or None to pass it straight through"""
+        if isinstance(query, MESSAGE_METHODS):
+            default = Priority.NORMAL
+            peer = getattr(query, "to_peer", None) or getattr(query, "peer", None)
+        elif isinstance(query, MODERATION_METHODS):
+            default = Priority.MODERATION
+            peer = None
+        else:
+            return None
+
+        override = _lane_override.get()
+        chat, private = _peer_id(peer) if peer is not None else (None, False)
+        return Route(default if override is None else override, chat, private)
+
+    def _bucket(self, route: Route) -> Optional[TokenBucket]:
+        if route.chat is None:
+            return None
+        bucket = self._chats.get(route.chat)
+        if bucket is None:
+            if route.private:
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self._chats[route.chat] = bucket
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(route.chat)
+        return bucket
+
+    def max_wait(self, route: Route) -> Optional[float]:
+        """Longest a call on this route may wait for its grant (None = as long as it takes)"""
+        return self.max_normal_wait if route.priority == Priority.NORMAL else None
+
+    def _expected_wait(self, route: Route, now: float) -> float:
+        """Lower bound on a new call's wait: its chat's refill plus everything queued for that chat"""
+        bucket = self._bucket(route)
+        if bucket is None:
+            return 0.0
+        return bucket.delay(now) + self._queued.get(route.chat, 0) / bucket.rate
+
+    async def acquire(self, route: Route):
+        """Wait until this call may be sent
+
+        Raises:
+            OutboxBusy: The route's lane has a wait bound and the call would exceed it
+        """
+        max_wait = self.max_wait(route)
+        now = time.monotonic()
+        if max_wait is not None and self._expected_wait(route, now) > max_wait:
+            # Refuse up front: the handler is freed at once instead of after max_wait
+            self.dropped += 1
+            raise OutboxBusy(f"chat {route.chat} is over its send rate; try again shortly")
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[route.priority].append(_Ticket(future, route, now))
+        if route.chat is not None:
+            self._queued[route.chat] = self._queued.get(route.chat, 0) + 1
+        self._wakeup.set()
+        try:
+            if max_wait is None:
+                await future
+            else:
+                # The estimate ignores other chats and lanes; this bounds the wait regardless.
+                # A cancelled ticket is skipped by the dispatcher.
+                await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            raise OutboxBusy(f"no send slot for chat {route.chat} within {max_wait:g}s") from None
+        finally:
+            if route.chat is not None:
+                remaining = self._queued.get(route.chat, 1) - 1
+                if remaining:
+                    self._queued[route.chat] = remaining
+                else:
+                    self._queued.pop(route.chat, None)
+
+    def penalize(self, route: Route, seconds: float):
+        """Apply a FloodWait to the bucket it most likely came from"""
+        self.flood_waits += 1
+        until = time.monotonic() + seconds
+        bucket = self._bucket(route)
+        (bucket or self._global).block(until)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _grant_next(self, now: float) -> Optional[float]:
+        """Grant one waiting call if possible; otherwise return how long to sleep (None = idle)"""
+        global_delay = self._global.delay(now)
+        wait = None
+        for tickets in self._lanes:
+            if not tickets:
+                continue
+            if global_delay:
+                return global_delay
+            for index, ticket in enumerate(tickets):
+                if index >= self.SCAN_DEPTH:
+                    break
+                if ticket.future.done():
+                    del tickets[index]  # Caller gave up (cancelled)
+                    return 0.0
+                bucket = self._bucket(ticket.route)
+                delay = bucket.delay(now) if bucket else 0.0
+                if delay:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+
+                del tickets[index]
+                self._global.take()
+                if bucket:
+                    bucket.take()
+                waited = now - ticket.queued_at
+                self.granted += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self._recent_waits.append(waited)
+                ticket.future.set_result(None)
+                return 0.0
+        return wait
+
+    async def _dispatch(self):
+        while True:
+            wait = self._grant_next(time.monotonic())
+            if wait == 0.0:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Cancel the dispatcher and fail anything still queued"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for tickets in self._lanes:
+            while tickets:
+                ticket = tickets.popleft()
+                if not ticket.future.done():
+                    ticket.future.set_exception(ConnectionError("Outbox stopped"))
+
+    def stats(self) -> dict:
+        """Queue depth per lane, grant count, FloodWaits and queueing delay"""
+        recent = sorted(self._recent_waits)
+        return {
+            "queued": {priority.name.lower(): len(self._lanes[priority]) for priority in Priority},
+            "granted": self.granted,
+            "flood_waits": self.flood_waits,
+            "dropped": self.dropped,
+            "wait_avg": self.wait_total / self.granted if self.granted else 0.0,
+            "wait_p95": recent[int(len(recent) * 0.95)] if recent else 0.0,
+            "wait_max": self.wait_max,
+            "chats": len(self._chats),
+        }
+
+# Process-wide scheduler shared by every client call
+outbox = SendScheduler(
+    global_rate=Config.OUTBOX_GLOBAL_RATE,
+    group_per_minute=Config.OUTBOX_GROUP_PER_MINUTE,
+    private_rate=Config.OUTBOX_PRIVATE_RATE,
+    max_flood_wait=Config.OUTBOX_MAX_FLOOD_WAIT,
+    max_normal_wait=Config.OUTBOX_MAX_QUEUE_WAIT or None
+)
+
+class ScheduledClient(Client):
+    """Client whose send-like calls go through the outbox
+
+    Pyrogram's high-level methods (reply_text, restrict_chat_member, ...) all end
+    in invoke(), so plugins keep calling them as usual. A NORMAL-lane call that
+    cannot be granted within OUTBOX_MAX_QUEUE_WAIT raises OutboxBusy, so a chat
+    over its limit cannot pin the update workers that every other chat needs.
+    """
+
+    async def invoke(
+        self,
+        query,
+        retries: int = Session.MAX_RETRIES,
+        timeout: float = Session.WAIT_TIMEOUT,
+        sleep_threshold: float = None
+    ):
+        route = outbox.route(query)
+        if route is None:
+            return await super().invoke(query, retries, timeout, sleep_threshold)
+
+        for attempt in range(FLOOD_RETRIES + 1):
+            await outbox.acquire(route)
+            try:
+                # sleep_threshold=0: surface every FloodWait here instead of sleeping inside the session
+                return await super().invoke(query, retries, timeout, 0)
+            except (FloodWait, SlowmodeWait) as e:
+                outbox.penalize(route, e.value)
+                if e.value > outbox.max_flood_wait or attempt == FLOOD_RETRIES:
+                    raise
+                LOGGER.warning(f"FloodWait {e.value}s on {type(query).__name__}, re-queued")
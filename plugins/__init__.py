@@ -1,6 +1,6 @@
 """
 Plugins package initializer
 """
-from . import admin, info, utilities, antiflood, welcome, search
+from . import admin, info, utilities, antiflood, welcome, search, moderation, inline
 
-__all__ = ['admin', 'info', 'utilities', 'antiflood', 'welcome', 'search']
\ No newline at end of file
+__all__ = ['admin', 'info', 'utilities', 'antiflood', 'welcome', 'search', 'moderation', 'inline']
\ No newline at end of file
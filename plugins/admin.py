@@ -2,16 +2,20 @@
 Admin management commands
 """
 from pyrogram import Client, filters
-from pyrogram.types import Message, ChatPermissions
+from pyrogram.types import Message, ChatPermissions, ChatMemberUpdated
 from pyrogram.errors import ChatAdminRequired, UserAdminInvalid, FloodWait
-from pyrogram.enums import ChatMemberStatus
-from database import Database
+from database import db
+from admin_cache import admin_cache, ADMIN_STATUSES
 from logger import LOGGER
 from config import Config
 import asyncio
 from datetime import datetime, timedelta
+from typing import Tuple
 
-db = Database()
+# /purge: ids per delete_messages call (the API maximum), calls in flight, seconds between progress edits
+PURGE_CHUNK = 100
+PURGE_WORKERS = 4
+PURGE_PROGRESS_INTERVAL = 2
 
 async def parse_user_input(client: Client, user_input: str):
     """
@@ -43,8 +47,7 @@ async def parse_user_input(client: Client, user_input: str):
 def admin_check(func):
     """Decorator to check if user is admin"""
     async def wrapper(client: Client, message: Message):
-        chat_member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if chat_member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         return await func(client, message)
@@ -54,6 +57,16 @@ def is_owner(user_id: int) -> bool:
     """Check if user is the bot owner"""
     return user_id == Config.OWNER_ID
 
+@Client.on_chat_member_updated(filters.group)
+async def track_admin_changes(client: Client, update: ChatMemberUpdated):
+    """Keep the cached admin roster in sync with promotions, demotions and departures"""
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    
+    is_admin = bool(update.new_chat_member) and update.new_chat_member.status in ADMIN_STATUSES
+    admin_cache.update(update.chat.id, member.user.id, is_admin)
+
 @Client.on_message(filters.command("ban") & filters.group)
 @admin_check
 async def ban_user(client: Client, message: Message):
@@ -82,8 +95,7 @@ async def ban_user(client: Client, message: Message):
             return
         
         # Check if target is admin
-        target_member = await client.get_chat_member(message.chat.id, user_id)
-        if target_member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if await admin_cache.is_admin(client, message.chat.id, user_id):
             await message.reply_text("❌ Cannot ban an admin!")
             return
         
@@ -147,8 +159,7 @@ async def kick_user(client: Client, message: Message):
             await message.reply_text("❌ Cannot kick the bot owner!")
             return
         
-        target_member = await client.get_chat_member(message.chat.id, user_id)
-        if target_member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if await admin_cache.is_admin(client, message.chat.id, user_id):
             await message.reply_text("❌ Cannot kick an admin!")
             return
         
@@ -281,8 +292,7 @@ async def warn_user(client: Client, message: Message):
             await message.reply_text("❌ Cannot warn the bot owner!")
             return
         
-        await db.add_warning(message.chat.id, user_id)
-        warnings = await db.get_warnings(message.chat.id, user_id)
+        warnings = await db.add_warning(message.chat.id, user_id)
         
         if warnings >= 3:
             await client.ban_chat_member(message.chat.id, user_id)
@@ -364,27 +374,125 @@ async def unpin_message(client: Client, message: Message):
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
 
+async def purge_range(client: Client, chat_id: int, start_id: int, end_id: int,
+                      user_id: int = None, progress=None) -> Tuple[int, int]:
+    """
+    Delete messages start_id..end_id in PURGE_CHUNK-id calls spread over PURGE_WORKERS workers
+    
+    A FloodWait that reaches this far has already outlasted the outbox's own re-queues
+    (or exceeds OUTBOX_MAX_FLOOD_WAIT), so the purge stops instead of sleeping on it.
+    
+    Args:
+        user_id: Only delete this user's messages (each chunk is fetched first to filter it)
+        progress: Optional async callback(chunks_done, chunks_total, deleted)
+    
+    Returns:
+        tuple: (messages deleted, seconds Telegram asked to wait if it stopped early, else 0)
+    """
+    chunks = [
+        (low, min(low + PURGE_CHUNK, end_id + 1))
+        for low in range(start_id, end_id + 1, PURGE_CHUNK)
+    ]
+    pending = iter(chunks)
+    state = {"done": 0, "deleted": 0, "flood_wait": 0}
+    
+    async def delete_chunk(low: int, high: int) -> int:
+        ids = list(range(low, high))
+        if user_id is not None:
+            messages = await client.get_messages(chat_id, ids)
+            ids = [
+                msg.id for msg in messages
+                if not msg.empty and msg.from_user and msg.from_user.id == user_id
+            ]
+            if not ids:
+                return 0
+        return await client.delete_messages(chat_id, ids)
+    
+    async def worker():
+        # Chunks are handed out one at a time, so at most PURGE_WORKERS calls are in flight
+        for low, high in pending:
+            if state["flood_wait"]:
+                return
+            try:
+                count = await delete_chunk(low, high)
+            except FloodWait as e:
+                state["flood_wait"] = max(state["flood_wait"], e.value)
+                return
+            state["deleted"] += count
+            state["done"] += 1
+            if progress:
+                await progress(state["done"], len(chunks), state["deleted"])
+    
+    await asyncio.gather(*(worker() for _ in range(min(PURGE_WORKERS, len(chunks)))))
+    return state["deleted"], state["flood_wait"]
+
 @Client.on_message(filters.command("purge") & filters.group)
 @admin_check
 async def purge_messages(client: Client, message: Message):
-    """Delete messages in bulk"""
+    """Delete messages in bulk: /purge (reply), /purge user (reply), /purge N [@user]"""
     try:
-        if not message.reply_to_message:
-            await message.reply_text("❌ Reply to a message to start purging from!")
-            return
+        args = message.command[1:]
+        user_id = None
         
-        msg_ids = []
-        start_id = message.reply_to_message.id
-        end_id = message.id
+        if message.reply_to_message:
+            start_id = message.reply_to_message.id
+            if args and args[0].lower() == "user":
+                if not message.reply_to_message.from_user:
+                    await message.reply_text("❌ Can't tell who sent that message!")
+                    return
+                user_id = message.reply_to_message.from_user.id
+            elif args:
+                await message.reply_text("❌ Usage: reply with /purge or /purge user")
+                return
+        elif args and args[0].isdigit() and int(args[0]) > 0:
+            start_id = max(1, message.id - int(args[0]))
+            if len(args) > 1:
+                try:
+                    user_id, _ = await parse_user_input(client, args[1])
+                except Exception as e:
+                    await message.reply_text(f"❌ {str(e)}")
+                    return
+        else:
+            await message.reply_text(
+                "❌ Usage:\n"
+                "• Reply with /purge - delete from that message to here\n"
+                "• Reply with /purge user - only that user's messages\n"
+                "• /purge N [@user] - the last N messages (optionally one user's)"
+            )
+            return
         
-        for msg_id in range(start_id, end_id + 1):
-            msg_ids.append(msg_id)
+        end_id = message.id - 1
+        status = await client.send_message(message.chat.id, "🗑️ Purging...")
+        last_update = 0.0
         
-        await client.delete_messages(message.chat.id, msg_ids)
+        async def report(done: int, total: int, deleted: int):
+            nonlocal last_update
+            now = asyncio.get_running_loop().time()
+            if done == total or now - last_update < PURGE_PROGRESS_INTERVAL:
+                return  # The final count is posted once purge_range returns
+            last_update = now
+            try:
+                await status.edit_text(f"🗑️ Purging... {done}/{total} batches, {deleted} deleted")
+            except Exception:
+                pass  # Progress is cosmetic
+        
+        deleted, flood_wait = 0, 0
+        if end_id >= start_id:
+            deleted, flood_wait = await purge_range(client, message.chat.id, start_id, end_id, user_id, report)
+        if flood_wait:
+            await status.edit_text(
+                f"⚠️ Purged {deleted} messages, then Telegram asked to wait {flood_wait} seconds.\n"
+                "Run /purge again after that to delete the rest."
+            )
+            return
+        try:
+            await message.delete()
+        except Exception:
+            pass
         
-        purge_msg = await message.reply_text(f"🗑️ Purged {len(msg_ids)} messages!")
+        await status.edit_text(f"🗑️ Purged {deleted} messages!")
         await asyncio.sleep(3)
-        await purge_msg.delete()
+        await status.delete()
         
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
@@ -426,6 +534,7 @@ async def promote_user(client: Client, message: Message):
             can_manage_chat=True,
             can_manage_video_chats=True
         )
+        admin_cache.update(message.chat.id, user_id, True)
         await message.reply_text(f"⬆️ Promoted {user_name} to admin!")
         
     except Exception as e:
@@ -468,6 +577,7 @@ async def demote_user(client: Client, message: Message):
             can_manage_chat=False,
             can_manage_video_chats=False
         )
+        admin_cache.update(message.chat.id, user_id, False)
         await message.reply_text(f"⬇️ Demoted {user_name}!")
         
     except Exception as e:
@@ -1,90 +1,234 @@
 """
 Anti-flood protection plugin
+Message floods per user, and join raids per chat
 """
 from pyrogram import Client, filters
 from pyrogram.types import Message, ChatPermissions
-from pyrogram.enums import ChatMemberStatus
-from database import Database
+from pyrogram.utils import zero_datetime
+from database import db
+from admin_cache import admin_cache
+from config import Config
 from logger import LOGGER
-from collections import defaultdict
+from outbox import Priority, lane
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import json
+import sys
+import time
 
-db = Database()
+# Limits accepted by /setflood
+FLOOD_ACTIONS = ("mute", "kick", "ban")
+MIN_THRESHOLD, MAX_THRESHOLD = 2, 20  # messages
+MAX_TIMEFRAME = 60  # seconds; also how long an idle user's history is kept
+# Telegram treats an until_date under 30 seconds or over 366 days away as permanent
+MIN_DURATION, MAX_DURATION = 30, 366 * 86400  # seconds; 0 still means forever
 
-# Store message counts: {chat_id: {user_id: [(timestamp, count)]}}
-message_tracker = defaultdict(lambda: defaultdict(list))
+class FloodSettings:
+    """One chat's flood limits; columns left NULL in the chats row fall back to Config"""
+    __slots__ = ("threshold", "timeframe", "action", "duration")
+    
+    def __init__(self, threshold: int, timeframe: int, action: str, duration: int):
+        self.threshold = threshold
+        self.timeframe = timeframe
+        self.action = action
+        self.duration = duration  # seconds a mute/ban lasts (0 = forever)
+    
+    @classmethod
+    def from_chat(cls, chat: Optional[dict]) -> "FloodSettings":
+        chat = chat or {}
+        
+        def value(column, default):
+            stored = chat.get(column)
+            return default if stored is None else stored
+        
+        return cls(
+            value("flood_threshold", Config.FLOOD_THRESHOLD),
+            value("flood_timeframe", Config.FLOOD_TIMEFRAME),
+            value("flood_action", Config.FLOOD_ACTION),
+            clamp_duration(value("flood_duration", Config.FLOOD_BAN_TIME))
+        )
+    
+    def to_columns(self) -> Dict[str, object]:
+        """Chats-table columns for update_chat_settings"""
+        return {
+            "flood_threshold": self.threshold,
+            "flood_timeframe": self.timeframe,
+            "flood_action": self.action,
+            "flood_duration": self.duration,
+        }
+    
+    def describe(self) -> str:
+        penalty = self.action
+        if self.action != "kick":
+            penalty += f" for {format_duration(self.duration)}" if self.duration else " forever"
+        return (
+            f"• Maximum: {self.threshold} messages\n"
+            f"• Timeframe: {self.timeframe} seconds\n"
+            f"• Action: {penalty}"
+        )
+
+def parse_duration(value: str) -> int:
+    """Parse 30s/10m/2h/1d (or bare seconds) into seconds; raises ValueError"""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    value = value.lower()
+    if value[-1:] in units:
+        seconds = int(value[:-1]) * units[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds < 0:
+        raise ValueError("negative duration")
+    return seconds
 
-# Flood settings
-FLOOD_THRESHOLD = 5  # messages
-FLOOD_TIMEFRAME = 5  # seconds
-FLOOD_BAN_DURATION = 300  # 5 minutes
+def clamp_duration(seconds: int) -> int:
+    """Pull a non-zero duration into the range Telegram honours as a temporary restriction"""
+    return min(max(seconds, MIN_DURATION), MAX_DURATION) if seconds else 0
 
-def check_flood(chat_id, user_id):
-    """Check if user is flooding"""
-    now = datetime.now()
-    user_messages = message_tracker[chat_id][user_id]
+def format_duration(seconds: int) -> str:
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds % size == 0:
+            count = seconds // size
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return f"{seconds} seconds"
+
+class FloodTracker:
+    """Sliding-window message counter per (chat, user) with bounded memory
     
-    # Remove old messages outside timeframe
-    user_messages[:] = [
-        (ts, count) for ts, count in user_messages
-        if now - ts < timedelta(seconds=FLOOD_TIMEFRAME)
-    ]
+    Each user keeps a ring buffer of their last `threshold` message times, so a
+    check is O(1): the user floods when the buffer is full and its oldest entry
+    is still inside the window. Users are kept in LRU order; idle ones are swept
+    periodically and the least recently active are dropped past max_users.
+    Per-chat limits are resolved from the chats row once and then held here, so
+    the hot path never goes to the database for them.
+    """
     
-    # Count recent messages
-    total_messages = sum(count for _, count in user_messages)
+    def __init__(self, max_users: int = 100000, sweep_interval: float = 60, idle_after: float = MAX_TIMEFRAME):
+        self.max_users = max_users
+        self.sweep_interval = sweep_interval
+        self.idle_after = idle_after  # must cover the longest window any chat may use
+        self._users: "OrderedDict[tuple, deque]" = OrderedDict()  # (chat_id, user_id) -> times
+        self._settings: Dict[int, FloodSettings] = {}  # chat_id -> limits
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.evictions = 0
     
-    # Add current message
-    user_messages.append((now, 1))
+    def settings_for(self, chat_id: int, chat: Optional[dict]) -> FloodSettings:
+        """A chat's limits, resolved from its (already fetched) chats row on first use"""
+        settings = self._settings.get(chat_id)
+        if settings is None:
+            settings = FloodSettings.from_chat(chat)
+            self._settings[chat_id] = settings
+        return settings
     
-    return total_messages >= FLOOD_THRESHOLD
-
-@Client.on_message(filters.group, group=10)
-async def antiflood_handler(client: Client, message: Message):
-    """Monitor and prevent flooding"""
-    try:
-        # Skip if from admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-            return
+    def configure(self, chat_id: int, settings: FloodSettings):
+        """Replace a chat's limits after /setflood has persisted them"""
+        self._settings[chat_id] = settings
+    
+    def forget_chat(self, chat_id: int):
+        """Drop a chat's limits (e.g. anti-flood turned off); reloaded on next use"""
+        self._settings.pop(chat_id, None)
+    
+    def hit(self, chat_id: int, user_id: int, threshold: int, timeframe: float) -> bool:
+        """Record a message and return True if it pushes the user over the limit"""
+        now = time.monotonic()
+        key = (chat_id, user_id)
+        stamps = self._users.get(key)
+        if stamps is None or stamps.maxlen != threshold:
+            # New user, or the chat's threshold changed: (re)insert at the most recent end,
+            # keeping the latest times that still fit
+            stamps = deque(self._users.pop(key, ()), maxlen=threshold)
+            self._users[key] = stamps
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._users.move_to_end(key)
         
-        # Check chat settings
-        chat = await db.get_chat(message.chat.id)
-        if not chat or not chat.get("antiflood", False):
-            return
+        flooding = len(stamps) == threshold and now - stamps[0] < timeframe
+        stamps.append(now)
         
-        # Check for flood
-        if check_flood(message.chat.id, message.from_user.id):
-            # Mute user
-            until_date = datetime.now() + timedelta(seconds=FLOOD_BAN_DURATION)
-            
-            await client.restrict_chat_member(
-                message.chat.id,
-                message.from_user.id,
-                ChatPermissions(),
-                until_date=until_date
-            )
-            
-            # Send warning
-            await message.reply_text(
-                f"🚫 {message.from_user.mention} has been muted for {FLOOD_BAN_DURATION // 60} minutes "
-                f"for flooding!\n\n⚠️ Flooding is not allowed in this chat."
-            )
-            
-            # Clear message tracker for this user
-            message_tracker[message.chat.id][message.from_user.id].clear()
-            
-            LOGGER.info(f"User {message.from_user.id} muted for flooding in {message.chat.id}")
+        if now >= self._next_sweep:
+            self.sweep(now, self.idle_after)
+        return flooding
     
-    except Exception as e:
-        LOGGER.error(f"Antiflood error: {e}")
+    def reset(self, chat_id: int, user_id: int):
+        """Forget a user's history (e.g. after muting them)"""
+        self._users.pop((chat_id, user_id), None)
+    
+    def sweep(self, now: float, idle_after: float):
+        """Drop users with no message inside idle_after seconds (oldest activity first)"""
+        while self._users:
+            key, stamps = next(iter(self._users.items()))
+            if now - stamps[-1] < idle_after:
+                break
+            del self._users[key]
+            self.evictions += 1
+        self._next_sweep = now + self.sweep_interval
+    
+    def stats(self) -> dict:
+        """Tracked users/chats and approximate memory use"""
+        entry_bytes = sum(sys.getsizeof(stamps) for stamps in self._users.values())
+        return {
+            "users": len(self._users),
+            "chats": len({chat_id for chat_id, _ in self._users}),
+            "configured": len(self._settings),
+            "evictions": self.evictions,
+            "bytes": sys.getsizeof(self._users) + entry_bytes,
+        }
+
+flood_tracker = FloodTracker()
+
+
+async def flood_stage(client: Client, ctx) -> bool:
+    """Moderation pipeline stage: punish users who flood; returns True if the sender was acted on"""
+    # Skip admins and chats without anti-flood enabled
+    if ctx.is_admin or not ctx.chat or not ctx.chat.get("antiflood", False):
+        return False
+    
+    settings = flood_tracker.settings_for(ctx.chat_id, ctx.chat)
+    if not flood_tracker.hit(ctx.chat_id, ctx.user_id, settings.threshold, settings.timeframe):
+        return False
+    
+    message = ctx.message
+    # Pyrogram cannot serialise until_date=None; its zero datetime is how it spells "forever"
+    until_date = datetime.now() + timedelta(seconds=settings.duration) if settings.duration else zero_datetime()
+    length = f" for {format_duration(settings.duration)}" if settings.duration else ""
+    
+    if settings.action == "ban":
+        await client.ban_chat_member(ctx.chat_id, ctx.user_id, until_date=until_date)
+        verb = f"banned{length}"
+    elif settings.action == "kick":
+        await client.ban_chat_member(ctx.chat_id, ctx.user_id)
+        await asyncio.sleep(1)
+        await client.unban_chat_member(ctx.chat_id, ctx.user_id)
+        verb = "kicked"
+    else:
+        await client.restrict_chat_member(
+            ctx.chat_id,
+            ctx.user_id,
+            ChatPermissions(),
+            until_date=until_date
+        )
+        verb = f"muted{length}"
+    
+    # Send warning
+    await message.reply_text(
+        f"🚫 {message.from_user.mention} has been {verb} for flooding!\n\n"
+        f"⚠️ Flooding is not allowed in this chat."
+    )
+    
+    # Clear message tracker for this user
+    flood_tracker.reset(ctx.chat_id, ctx.user_id)
+    
+    LOGGER.info(f"User {ctx.user_id} {verb} for flooding in {ctx.chat_id}")
+    return True
 
 @Client.on_message(filters.command("antiflood") & filters.group)
 async def toggle_antiflood(client: Client, message: Message):
     """Toggle anti-flood protection"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -96,15 +240,16 @@ async def toggle_antiflood(client: Client, message: Message):
         
         if action == "on":
             await db.update_chat_settings(message.chat.id, {"antiflood": True})
+            chat = await db.get_chat(message.chat.id)
+            flood_tracker.forget_chat(message.chat.id)
+            settings = flood_tracker.settings_for(message.chat.id, chat)
             await message.reply_text(
                 "✅ Anti-flood protection enabled!\n\n"
-                f"⚙️ Settings:\n"
-                f"• Maximum: {FLOOD_THRESHOLD} messages\n"
-                f"• Timeframe: {FLOOD_TIMEFRAME} seconds\n"
-                f"• Mute duration: {FLOOD_BAN_DURATION // 60} minutes"
+                f"⚙️ Settings:\n{settings.describe()}"
             )
         elif action == "off":
             await db.update_chat_settings(message.chat.id, {"antiflood": False})
+            flood_tracker.forget_chat(message.chat.id)
             await message.reply_text("❌ Anti-flood protection disabled!")
         else:
             await message.reply_text("❌ Invalid option! Use 'on' or 'off'")
@@ -115,48 +260,334 @@ async def toggle_antiflood(client: Client, message: Message):
 
 @Client.on_message(filters.command("setflood") & filters.group)
 async def set_flood_settings(client: Client, message: Message):
-    """Configure flood settings"""
+    """Configure this chat's flood settings"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
         if len(message.command) < 3:
             await message.reply_text(
-                "❌ Usage: /setflood [messages] [seconds]\n\n"
-                "Example: /setflood 5 10"
+                "❌ Usage: /setflood [messages] [seconds] [mute/kick/ban] [duration]\n\n"
+                "Example: /setflood 5 10 mute 10m"
             )
             return
         
+        chat = await db.get_chat(message.chat.id)
+        current = flood_tracker.settings_for(message.chat.id, chat)
+        
         try:
             threshold = int(message.command[1])
             timeframe = int(message.command[2])
-            
-            if threshold < 2 or threshold > 20:
-                await message.reply_text("❌ Threshold must be between 2 and 20!")
-                return
-            
-            if timeframe < 1 or timeframe > 60:
-                await message.reply_text("❌ Timeframe must be between 1 and 60 seconds!")
-                return
-            
-            # Update settings (you can store these in database too)
-            global FLOOD_THRESHOLD, FLOOD_TIMEFRAME
-            FLOOD_THRESHOLD = threshold
-            FLOOD_TIMEFRAME = timeframe
-            
+            action = message.command[3].lower() if len(message.command) > 3 else current.action
+            duration = parse_duration(message.command[4]) if len(message.command) > 4 else current.duration
+        except ValueError:
+            await message.reply_text("❌ Invalid numbers or duration provided!")
+            return
+        
+        if threshold < MIN_THRESHOLD or threshold > MAX_THRESHOLD:
+            await message.reply_text(f"❌ Threshold must be between {MIN_THRESHOLD} and {MAX_THRESHOLD}!")
+            return
+        
+        if timeframe < 1 or timeframe > MAX_TIMEFRAME:
+            await message.reply_text(f"❌ Timeframe must be between 1 and {MAX_TIMEFRAME} seconds!")
+            return
+        
+        if action not in FLOOD_ACTIONS:
+            await message.reply_text("❌ Action must be one of: mute, kick, ban")
+            return
+        
+        if duration and (duration < MIN_DURATION or duration > MAX_DURATION):
             await message.reply_text(
-                f"✅ Flood settings updated!\n\n"
-                f"📊 New Settings:\n"
-                f"• Messages: {threshold}\n"
-                f"• Timeframe: {timeframe} seconds"
+                f"❌ Duration must be between {MIN_DURATION} seconds and {MAX_DURATION // 86400} days, "
+                "or 0 for forever! Telegram makes anything outside that range permanent."
             )
+            return
         
-        except ValueError:
-            await message.reply_text("❌ Invalid numbers provided!")
+        settings = FloodSettings(threshold, timeframe, action, duration)
+        await db.update_chat_settings(message.chat.id, settings.to_columns())
+        flood_tracker.configure(message.chat.id, settings)
+        
+        await message.reply_text(
+            f"✅ Flood settings updated!\n\n"
+            f"📊 New Settings:\n{settings.describe()}"
+        )
+    
+    except Exception as e:
+        await message.reply_text(f"❌ Error: {str(e)}")
+        LOGGER.error(f"Set flood error: {e}")
+
+# Join raids
+
+RAID_ACTIONS = ("kick", "mute", "ban")
+# Fields of ChatPermissions saved before a lockdown and restored after it
+PERMISSION_FIELDS = (
+    "can_send_messages", "can_send_media_messages", "can_send_other_messages", "can_send_polls",
+    "can_add_web_page_previews", "can_change_info", "can_invite_users", "can_pin_messages"
+)
+
+class Lockdown:
+    """A chat locked against a join raid, and the queue of raiders still to handle"""
+    
+    def __init__(self, chat_id: int, until: float, permissions: Optional[dict] = None):
+        self.chat_id = chat_id
+        self.until = until  # monotonic time the chat unlocks, pushed back while the raid goes on
+        self.permissions = permissions  # what to restore; None until read from the chat
+        self.started = time.monotonic()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.seen: Set[int] = set()
+        self.release = asyncio.Event()  # set by /endraid to unlock early
+        self.workers: List[asyncio.Task] = []
+        self.joins = 0
+        self.handled = 0
+        self.failed = 0
+    
+    def enqueue(self, user_ids):
+        for user_id in user_ids:
+            self.joins += 1
+            if user_id not in self.seen:
+                self.seen.add(user_id)
+                self.queue.put_nowait(user_id)
+
+class RaidGuard:
+    """Per-chat join-rate detector that locks a chat down during a join raid
+    
+    Each chat keeps the times of its recent joins; `threshold` joins within
+    `window` seconds lock the chat (nobody but admins may send), and everyone
+    in that burst and every later joiner is kicked, muted or banned by a few
+    workers per chat. Those calls go through the outbox's BULK lane, so a
+    1000-account raid is worked off at the API's pace without delaying anything
+    else. The chat unlocks once `cooldown` seconds pass without raid-rate joins,
+    and the lockdown is stored so a restart still unlocks it.
+    """
+    
+    def __init__(self, threshold: int = 15, window: float = 10, cooldown: float = 600,
+                 action: str = "kick", workers: int = 4, max_chats: int = 10000):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.action = action if action in RAID_ACTIONS else "kick"
+        self.workers = workers
+        self.max_chats = max_chats
+        self._joins: "OrderedDict[int, deque]" = OrderedDict()  # chat_id -> recent (time, user_id)
+        self._lockdowns: Dict[int, Lockdown] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.raids = 0
+        self.handled = 0
+    
+    def locked(self, chat_id: int) -> bool:
+        return chat_id in self._lockdowns
+    
+    def record(self, client: Client, chat_id: int, user_ids: List[int]):
+        """Count joins; starts a lockdown when they reach the threshold (never blocks)"""
+        if self.threshold <= 0 or not user_ids:
+            return
+        now = time.monotonic()
+        lockdown = self._lockdowns.get(chat_id)
+        joins = self._joins.get(chat_id)
+        if joins is None:
+            joins = self._joins[chat_id] = deque()
+            if len(self._joins) > self.max_chats:
+                self._joins.popitem(last=False)
+        else:
+            self._joins.move_to_end(chat_id)
+        for user_id in user_ids:
+            joins.append((now, user_id))
+        while joins and joins[0][0] <= now - self.window:
+            joins.popleft()
+        
+        if lockdown is not None:
+            lockdown.enqueue(user_ids)
+            if len(joins) >= self.threshold:
+                lockdown.until = now + self.cooldown  # Still raiding: stay locked
+            return
+        if len(joins) < self.threshold:
+            return
+        
+        # Registered before any await, so joins arriving meanwhile join the same lockdown
+        lockdown = Lockdown(chat_id, now + self.cooldown)
+        lockdown.enqueue(user_id for _, user_id in joins)
+        self._lockdowns[chat_id] = lockdown
+        self.raids += 1
+        self._spawn(self._run(client, lockdown))
+    
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def resume(self, client: Client):
+        """Re-arm lockdowns that were in force at the last shutdown"""
+        for row in await db.get_lockdowns():
+            remaining = max(0.0, row["until"] - time.time())
+            lockdown = Lockdown(row["chat_id"], time.monotonic() + remaining, json.loads(row["permissions"]))
+            self._lockdowns[lockdown.chat_id] = lockdown
+            LOGGER.info(f"Resuming raid lockdown in {lockdown.chat_id}, {remaining:.0f}s left")
+            self._spawn(self._run(client, lockdown, resumed=True))
+    
+    async def stop(self):
+        """Cancel running lockdowns; they stay stored and resume on next start"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def end(self, chat_id: int) -> bool:
+        """Unlock a chat early once its queued raiders are handled; False if it is not locked"""
+        lockdown = self._lockdowns.get(chat_id)
+        if lockdown is None:
+            return False
+        lockdown.release.set()
+        return True
+    
+    async def _run(self, client: Client, lockdown: Lockdown, resumed: bool = False):
+        chat_id = lockdown.chat_id
+        lockdown.workers = [asyncio.ensure_future(self._work(client, lockdown)) for _ in range(self.workers)]
+        try:
+            if not resumed:
+                try:
+                    await self._lock(client, lockdown)
+                except Exception as e:
+                    # Welcomes stay suppressed and raiders are still handled without the lock
+                    LOGGER.error(f"Raid lockdown in {chat_id} could not lock the chat: {e}")
+            await self._hold(lockdown)
+        except asyncio.CancelledError:
+            # Shutting down: the stored lockdown is resumed on the next start
+            for worker in lockdown.workers:
+                worker.cancel()
+            raise
+        except Exception as e:
+            LOGGER.error(f"Raid lockdown in {chat_id} failed: {e}")
+        
+        # Finish the raiders already queued before the chat opens again
+        for _ in lockdown.workers:
+            lockdown.queue.put_nowait(None)
+        await asyncio.gather(*lockdown.workers, return_exceptions=True)
+        await self._unlock(client, lockdown)
+    
+    async def _lock(self, client: Client, lockdown: Lockdown):
+        chat_id = lockdown.chat_id
+        with lane(Priority.MODERATION):
+            chat = await client.get_chat(chat_id)
+            current = chat.permissions or ChatPermissions()
+            lockdown.permissions = {field: bool(getattr(current, field)) for field in PERMISSION_FIELDS}
+            await db.save_lockdown(chat_id, json.dumps(lockdown.permissions), time.time() + self.cooldown)
+            await client.set_chat_permissions(chat_id, ChatPermissions())
+            await client.send_message(
+                chat_id,
+                f"🚨 Join raid detected ({lockdown.joins} joins in {self.window:.0f}s)!\n\n"
+                f"🔒 The chat is locked and new members are being {self._verb()}.\n"
+                f"It unlocks after {format_duration(max(1, int(self.cooldown)))} without raid activity."
+            )
+        LOGGER.warning(f"Raid lockdown started in {chat_id} after {lockdown.joins} joins")
+    
+    async def _hold(self, lockdown: Lockdown):
+        """Wait until the raid has been quiet for the cooldown (or /endraid)"""
+        saved_until = lockdown.until
+        while not lockdown.release.is_set():
+            remaining = lockdown.until - time.monotonic()
+            if remaining <= 0:
+                return
+            if lockdown.until - saved_until > 60:
+                # Keep the stored deadline roughly current in case of a restart
+                saved_until = lockdown.until
+                await db.save_lockdown(lockdown.chat_id, json.dumps(lockdown.permissions), time.time() + remaining)
+            try:
+                await asyncio.wait_for(lockdown.release.wait(), timeout=min(remaining, 60))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _work(self, client: Client, lockdown: Lockdown):
+        """Handle queued raiders one at a time; the outbox sets the actual pace"""
+        with lane(Priority.BULK):
+            while True:
+                user_id = await lockdown.queue.get()
+                if user_id is None:
+                    return
+                try:
+                    await self._act(client, lockdown.chat_id, user_id)
+                    lockdown.handled += 1
+                    self.handled += 1
+                except Exception as e:
+                    lockdown.failed += 1
+                    LOGGER.warning(f"Raid action on {user_id} in {lockdown.chat_id} failed: {e}")
+    
+    async def _act(self, client: Client, chat_id: int, user_id: int):
+        if self.action == "ban":
+            await client.ban_chat_member(chat_id, user_id)
+        elif self.action == "mute":
+            await client.restrict_chat_member(chat_id, user_id, ChatPermissions())
+        else:
+            # A ban that expires is a kick in one call, and keeps them out while locked
+            await client.ban_chat_member(
+                chat_id, user_id, until_date=datetime.now() + timedelta(seconds=max(self.cooldown, 60))
+            )
+    
+    async def _unlock(self, client: Client, lockdown: Lockdown):
+        chat_id = lockdown.chat_id
+        try:
+            if lockdown.permissions is not None:
+                with lane(Priority.MODERATION):
+                    await client.set_chat_permissions(chat_id, ChatPermissions(**lockdown.permissions))
+            await db.end_lockdown(chat_id)
+        except Exception as e:
+            # Leave the row so the next start tries again
+            LOGGER.error(f"Raid unlock in {chat_id} failed: {e}")
+        finally:
+            self._lockdowns.pop(chat_id, None)
+            self._joins.pop(chat_id, None)
+        
+        duration = format_duration(max(1, int(time.monotonic() - lockdown.started)))
+        summary = (
+            f"{lockdown.joins} joins, {lockdown.handled} {self._verb()}, "
+            f"{lockdown.failed} failed, locked for {duration}"
+        )
+        LOGGER.warning(f"Raid lockdown ended in {chat_id}: {summary}")
+        try:
+            await client.send_message(chat_id, f"🔓 Raid lockdown lifted.\n📊 {summary}")
+        except Exception as e:
+            LOGGER.warning(f"Raid summary in {chat_id} failed: {e}")
+    
+    def _verb(self) -> str:
+        return {"kick": "removed", "mute": "muted", "ban": "banned"}[self.action]
+    
+    def stats(self) -> Dict[str, int]:
+        return {"raids": self.raids, "locked": len(self._lockdowns), "handled": self.handled}
+
+raid_guard = RaidGuard(
+    threshold=Config.RAID_THRESHOLD,
+    window=Config.RAID_WINDOW,
+    cooldown=Config.RAID_COOLDOWN,
+    action=Config.RAID_ACTION,
+    workers=Config.RAID_WORKERS
+)
+
+@Client.on_message(filters.new_chat_members & filters.group, group=-1)
+async def watch_joins(client: Client, message: Message):
+    """Feed joins to the raid detector before the welcome handler sees them"""
+    try:
+        # Members added by an admin are not a raid
+        if message.from_user and message.from_user.id not in {u.id for u in message.new_chat_members}:
+            if await admin_cache.is_sender_admin(client, message):
+                return
+        raid_guard.record(client, message.chat.id, [user.id for user in message.new_chat_members if not user.is_self])
+    except Exception as e:
+        LOGGER.error(f"Raid watch error: {e}")
+
+@Client.on_message(filters.command("endraid") & filters.group)
+async def end_raid(client: Client, message: Message):
+    """Lift a raid lockdown early"""
+    try:
+        # Check if admin
+        if not await admin_cache.is_sender_admin(client, message):
+            await message.reply_text("❌ You need to be an admin to use this command!")
+            return
+        
+        if raid_guard.end(message.chat.id):
+            await message.reply_text("🔓 Ending the raid lockdown once queued raiders are handled...")
+        else:
+            await message.reply_text("ℹ️ This chat is not in a raid lockdown.")
     
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
-        LOGGER.error(f"Set flood error: {e}")
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Inline mode - @bot wiki ..., @bot define ..., @bot tr es ...
+Answers are built once per normalized query, cached, and paged with offsets
+"""
+import asyncio
+from typing import Dict, List, Tuple
+from pyrogram import Client
+from pyrogram.types import (
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent,
+    InlineKeyboardMarkup, InlineKeyboardButton
+)
+from cache import TTLCache
+from config import Config
+from logger import LOGGER
+from upstream import UpstreamUnavailable
+from plugins.search import fetch_wiki, fetch_definition, fetch_translation, format_definition
+
+INLINE_PAGE_SIZE = 20  # results per answer (Telegram allows up to 50)
+INLINE_DEBOUNCE = 0.35  # seconds a query must stay the user's latest before it is fetched
+INLINE_ERROR_CACHE_TIME = 5  # seconds Telegram may reuse an error answer
+# Upstream statuses whose answer is stable enough to cache; anything else is retried
+CACHEABLE_STATUSES = (200, 404)
+
+# Built result lists keyed by (kind, normalized query), shared by every user
+inline_cache = TTLCache(Config.INLINE_CACHE_SIZE, Config.INLINE_CACHE_TTL)
+# user_id -> id of their most recent inline query, for debouncing
+_latest: Dict[int, str] = {}
+
+def _article(title: str, text: str, description: str = None, **kwargs) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        title=title,
+        input_message_content=InputTextMessageContent(text),
+        description=description,
+        **kwargs
+    )
+
+HELP_RESULTS = [
+    _article("📚 wiki [query]", "Type `@bot wiki [query]` to search Wikipedia", "Search Wikipedia"),
+    _article("📖 define [word]", "Type `@bot define [word]` to look up a word", "Define an English word"),
+    _article("🌐 tr [lang] [text]", "Type `@bot tr es Hello` to translate", "Translate text"),
+]
+
+def _retry_later(description: str) -> Tuple[List[InlineQueryResultArticle], bool]:
+    """Answer for a transient upstream failure (5xx, 429, ...); never cached"""
+    return [_article("⚠️ Try again", "⚠️ The service did not answer, try again in a moment.", description)], False
+
+# Builders return (results, cacheable); only answers to a 200 or 404 may be cached
+
+async def build_wiki(query: str) -> Tuple[List[InlineQueryResultArticle], bool]:
+    status_code, data = await fetch_wiki(query)
+    if status_code not in CACHEABLE_STATUSES:
+        return _retry_later(query)
+    if status_code != 200 or data.get('type') == 'disambiguation' or not (data.get('extract') or "").strip():
+        return [_article("❌ No page found", f"❌ No Wikipedia page found for '{query}'!", query)], True
+
+    title = data.get('title', query)
+    extract = data['extract']
+    text = f"📚 **Wikipedia - {title}**\n\n{extract}"
+    if len(text) > 4096:
+        text = text[:4090] + "..."
+    page_url = data.get('content_urls', {}).get('desktop', {}).get('page', '')
+    return [_article(
+        title,
+        text,
+        extract[:200],
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📖 Read More", url=page_url)]
+        ]) if page_url else None,
+        thumb_url=data.get('thumbnail', {}).get('source') or None
+    )], True
+
+async def build_definition(word: str) -> Tuple[List[InlineQueryResultArticle], bool]:
+    word = word.split()[0]
+    status_code, entry = await fetch_definition(word)
+    if status_code not in CACHEABLE_STATUSES:
+        return _retry_later(word)
+    if entry is None:
+        return [_article("❌ No definition", f"❌ Could not find definition for '{word}'", word)], True
+
+    # The full entry first, then one result per individual sense
+    word_text = entry.get('word', word).capitalize()
+    results = [_article(word_text, format_definition(entry, word), "All meanings")]
+    for meaning in entry.get('meanings', []):
+        part_of_speech = meaning.get('partOfSpeech', '')
+        for definition in meaning.get('definitions', []):
+            def_text = definition.get('definition', '')
+            text = f"📖 **{word_text}** ({part_of_speech})\n\n{def_text}"
+            if definition.get('example'):
+                text += f"\n\n_Example: {definition['example']}_"
+            results.append(_article(f"{word_text} ({part_of_speech})", text, def_text))
+    return results, True
+
+async def build_translation(args: str) -> Tuple[List[InlineQueryResultArticle], bool]:
+    target_lang, _, text = args.partition(" ")
+    text = text.strip()
+    if not text:
+        return [_article("🌐 tr [lang] [text]", "Type `@bot tr es Hello` to translate", "Add some text to translate")], True
+
+    status_code, translated = await fetch_translation(text, target_lang)
+    if status_code not in CACHEABLE_STATUSES:
+        return _retry_later(text)
+    if translated is None:
+        return [_article("❌ Translation failed", "❌ Translation failed!", text)], True
+    return [_article(
+        f"🌐 Translation ({target_lang})",
+        f"🌐 **Translation**\n\n**Original:** {text}\n\n**Translated ({target_lang}):** {translated}",
+        translated
+    )], True
+
+BUILDERS = {
+    "wiki": build_wiki,
+    "define": build_definition,
+    "tr": build_translation,
+}
+
+def _cache_key(kind: str, args: str) -> tuple:
+    """Collapse whitespace; words and language codes are case-insensitive, titles and text are not"""
+    args = " ".join(args.split())
+    if kind == "tr":
+        target_lang, _, text = args.partition(" ")
+        return kind, target_lang.lower(), text
+    if kind == "wiki":
+        return kind, args
+    return kind, args.lower()
+
+async def _settled(inline_query: InlineQuery) -> bool:
+    """Wait out fast typing: True if no newer query from the same user arrived meanwhile"""
+    user_id = inline_query.from_user.id
+    _latest[user_id] = inline_query.id
+    await asyncio.sleep(INLINE_DEBOUNCE)
+    if _latest.get(user_id) != inline_query.id:
+        return False  # Superseded; Telegram drops answers to stale queries anyway
+    del _latest[user_id]
+    return True
+
+@Client.on_inline_query()
+async def inline_search(client: Client, inline_query: InlineQuery):
+    """Answer inline searches from the result cache, fetching on a miss"""
+    kind, _, args = inline_query.query.strip().partition(" ")
+    builder = BUILDERS.get(kind.lower())
+    if builder is None or not args.strip():
+        await inline_query.answer(HELP_RESULTS, cache_time=Config.INLINE_CACHE_TIME)
+        return
+
+    try:
+        key = _cache_key(kind.lower(), args)
+        results, cacheable = inline_cache.get(key), True
+        if results is None:
+            if not await _settled(inline_query):
+                return
+            results, cacheable = await builder(args.strip())
+            if cacheable:
+                inline_cache.set(key, results)
+
+        offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+        end = offset + INLINE_PAGE_SIZE
+        await inline_query.answer(
+            results[offset:end],
+            cache_time=Config.INLINE_CACHE_TIME if cacheable else INLINE_ERROR_CACHE_TIME,
+            next_offset=str(end) if end < len(results) else ""
+        )
+
+    except UpstreamUnavailable as e:
+        await inline_query.answer(
+            [_article("❌ Unavailable", f"❌ {str(e)}", str(e))],
+            cache_time=INLINE_ERROR_CACHE_TIME
+        )
+    except Exception as e:
+        LOGGER.error(f"Inline query error: {e}")
@@ -0,0 +1,68 @@
+"""
+Group message moderation pipeline
+Builds one context per message, then runs anti-flood, blacklist and AFK stages in order
+"""
+import asyncio
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from database import db
+from admin_cache import admin_cache
+from logger import LOGGER
+from outbox import Priority, lane
+from plugins.antiflood import flood_stage
+from plugins.utilities import afk_stage, blacklist_stage
+
+class MessageContext:
+    """Per-message state shared by every moderation stage"""
+    __slots__ = ("message", "chat_id", "user_id", "text", "is_admin", "chat", "blacklist")
+
+    def __init__(self, message: Message, is_admin: bool, lookup: dict):
+        self.message = message
+        self.chat_id = message.chat.id
+        self.user_id = message.from_user.id
+        self.text = message.text or message.caption or ""
+        self.is_admin = is_admin
+        self.chat = lookup["chat"]  # chats row or None
+        self.blacklist = lookup["blacklist"]  # compiled BlacklistMatcher
+
+# Stages run in this order; a stage returning True stops the rest
+# (a muted flooder or a deleted message needs no AFK notices)
+STAGES = (flood_stage, blacklist_stage, afk_stage)
+
+async def build_context(client: Client, message: Message) -> MessageContext:
+    """Fetch admin status and the batched database lookup concurrently
+    
+    Admin status comes from the per-chat roster cache; the first message in a chat
+    (or the first after the roster expires) loads it with one get_chat_members call.
+    """
+    is_admin, lookup = await asyncio.gather(
+        admin_cache.is_sender_admin(client, message),
+        db.get_message_context(message.chat.id)
+    )
+
+    # First message seen from this chat: register it so settings can be stored
+    if lookup["chat"] is None:
+        await db.add_chat(message.chat.id, message.chat.title)
+
+    return MessageContext(message, is_admin, lookup)
+
+@Client.on_message(filters.group & ~filters.service, group=1)
+async def moderate_message(client: Client, message: Message):
+    """Run every moderation stage against one shared context"""
+    if not message.from_user:
+        return  # Channel posts and anonymous senders
+
+    try:
+        ctx = await build_context(client, message)
+    except Exception as e:
+        LOGGER.error(f"Moderation context error: {e}")
+        return
+
+    # Mutes, deletions and their notices jump ahead of ordinary command replies
+    with lane(Priority.MODERATION):
+        for stage in STAGES:
+            try:
+                if await stage(client, ctx):
+                    break
+            except Exception as e:
+                LOGGER.error(f"Moderation stage {stage.__name__} error: {e}")
@@ -4,9 +4,162 @@ Search commands - Google, Wikipedia, YouTube, etc.
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from logger import LOGGER
-import aiohttp
+from upstream import upstreams, UpstreamUnavailable
+from dictionary import offline_dictionary
+from typing import List, Optional, Tuple
+import asyncio
+import re
 import urllib.parse
 
+# Fetchers shared by the commands below and by inline mode (plugins/inline.py)
+
+async def fetch_wiki(query: str) -> Tuple[int, Optional[dict]]:
+    """Wikipedia page summary; returns (status, data) with data None unless status is 200"""
+    # Titles are case-sensitive, so the cache key keeps the case the URL is sent with
+    query = " ".join(query.split())
+    url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}"
+    return await upstreams.fetch("wiki", query, url)
+
+# Longest percent-encoded chunk sent in one translate URL (GET URLs fail past ~2 KB)
+TRANSLATE_CHUNK_BYTES = 1800
+# Chunks of one text translated at once; stays under the upstream's concurrency cap
+TRANSLATE_PARALLEL = 4
+# Split points: after sentence punctuation, or at line breaks
+SENTENCE_BREAK = re.compile(r"(?<=[.!?;\u3002\uff01\uff1f])\s+|\s*\n\s*")
+
+def _encoded_len(text: str) -> int:
+    return len(urllib.parse.quote(text))
+
+def _split_oversized(text: str, limit: int) -> List[str]:
+    """Break a single over-long sentence at spaces, or anywhere if it has none"""
+    pieces, current = [], ""
+    for word in re.split(r"(?<=\s)", text):
+        while _encoded_len(word) > limit:
+            # No usable space: cut the longest prefix that fits
+            cut = len(word)
+            while _encoded_len(word[:cut]) > limit:
+                cut = cut * limit // _encoded_len(word[:cut]) or 1
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:cut])
+            word = word[cut:]
+        if current and _encoded_len(current + word) > limit:
+            pieces.append(current)
+            current = ""
+        current += word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_for_translation(text: str, limit: int = TRANSLATE_CHUNK_BYTES) -> List[Tuple[str, str]]:
+    """
+    Split text into chunks whose URL-encoded form fits in one request
+
+    Chunks end at sentence boundaries where possible, so each is translated with
+    its own context. Returns (chunk, separator) pairs; joining the translated
+    chunks with their separators rebuilds the layout (line breaks included).
+    """
+    sentences, position = [], 0
+    for match in SENTENCE_BREAK.finditer(text):
+        sentences.append((text[position:match.start()], match.group()))
+        position = match.end()
+    sentences.append((text[position:], ""))
+
+    chunks, current, current_sep = [], "", ""
+
+    def flush():
+        body = current.rstrip()
+        chunks.append((body, current[len(body):] + current_sep))
+
+    for sentence, separator in sentences:
+        if not sentence:
+            current_sep += separator
+            continue
+        for piece in (_split_oversized(sentence, limit) if _encoded_len(sentence) > limit else [sentence]):
+            candidate = current + current_sep + piece if current else piece
+            if current and (_encoded_len(candidate) > limit or "\n" in current_sep):
+                # Line breaks always end a chunk so they survive translation
+                flush()
+                candidate = piece
+            current, current_sep = candidate, ""
+        current_sep = separator
+    if current:
+        flush()
+    return chunks
+
+async def _translate_chunk(text: str, target_lang: str) -> Tuple[int, Optional[str]]:
+    url = f"https://translate.googleapis.com/translate_a/single?client=gtx&sl=auto&tl={target_lang}&dt=t&q={urllib.parse.quote(text)}"
+    status_code, data = await upstreams.fetch("translate", f"{target_lang.lower()}:{text}", url)
+    if status_code != 200:
+        return status_code, None
+    return status_code, "".join(item[0] for item in data[0] if item[0])
+
+async def fetch_translation(text: str, target_lang: str) -> Tuple[int, Optional[str]]:
+    """
+    Translate text of any length with Google Translate
+
+    The text is split at sentence boundaries and the chunks are translated
+    concurrently, each cached on its own, so re-translating an edited text
+    only fetches the chunks that changed.
+
+    Returns:
+        tuple: (status: int, translated text or None); the status is the first
+        failing chunk's, or 200
+    """
+    chunks = split_for_translation(text.strip())
+    if not chunks:
+        return 400, None
+    limiter = asyncio.Semaphore(TRANSLATE_PARALLEL)
+
+    async def translate(chunk: str) -> Tuple[int, Optional[str]]:
+        async with limiter:
+            return await _translate_chunk(chunk, target_lang)
+
+    results = await asyncio.gather(*(translate(chunk) for chunk, _ in chunks))
+    for status_code, translated in results:
+        if translated is None:
+            return status_code, None
+    return 200, "".join(translated + separator for (_, translated), (_, separator) in zip(results, chunks))
+
+async def fetch_definition(word: str) -> Tuple[int, Optional[dict]]:
+    """First dictionary entry for an English word; returns (status, entry or None)"""
+    word = word.lower()
+    # The local dictionary answers without the network; the API covers its misses
+    entry = offline_dictionary.lookup(word)
+    if entry is not None:
+        return 200, entry
+    url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}"
+    status_code, data = await upstreams.fetch("dictionary", word, url)
+    return status_code, data[0] if status_code == 200 and data else None
+
+def format_definition(entry: dict, word: str, max_meanings: int = 3, max_definitions: int = 2) -> str:
+    """Render a dictionary entry the way /define shows it"""
+    word_text = entry.get('word', word).capitalize()
+    phonetic = entry.get('phonetic', '')
+    
+    text = f"📖 **{word_text}**"
+    if phonetic:
+        text += f" _{phonetic}_"
+    text += "\n\n"
+    
+    meanings = entry.get('meanings', [])
+    for meaning in meanings[:max_meanings]:
+        part_of_speech = meaning.get('partOfSpeech', '')
+        definitions = meaning.get('definitions', [])
+        
+        if definitions:
+            text += f"**{part_of_speech.capitalize()}:**\n"
+            for j, definition in enumerate(definitions[:max_definitions], 1):
+                def_text = definition.get('definition', '')
+                text += f"{j}. {def_text}\n"
+                
+                example = definition.get('example')
+                if example:
+                    text += f"   _Example: {example}_\n"
+            text += "\n"
+    return text
+
 @Client.on_message(filters.command("google"))
 async def google_search(client: Client, message: Message):
     """Google search"""
@@ -47,57 +200,53 @@ async def wikipedia_search(client: Client, message: Message):
         
         status = await message.reply_text("🔍 Searching Wikipedia...")
         
-        # Wikipedia API
-        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Check if the page type is valid (not a disambiguation or missing page)
-                    page_type = data.get('type', '')
-                    if page_type == 'disambiguation':
-                        await status.edit_text(f"❌ '{query}' is a disambiguation page. Please be more specific!")
-                        return
-                    
-                    title = data.get('title', 'Not Found')
-                    extract = data.get('extract', 'No information available.')
-                    page_url = data.get('content_urls', {}).get('desktop', {}).get('page', '')
-                    thumbnail = data.get('thumbnail', {}).get('source', '')
-                    
-                    # Check if we got meaningful content
-                    if not extract or not extract.strip():
-                        await status.edit_text(f"❌ No information found for '{query}'!")
-                        return
-                    
-                    text = f"📚 **Wikipedia - {title}**\n\n{extract}"
-                    
-                    if len(text) > 4096:
-                        text = text[:4090] + "..."
-                    
-                    keyboard = InlineKeyboardMarkup([
-                        [InlineKeyboardButton("📖 Read More", url=page_url)]
-                    ]) if page_url else None
-                    
-                    if thumbnail:
-                        try:
-                            await status.delete()
-                            await message.reply_photo(
-                                thumbnail,
-                                caption=text,
-                                reply_markup=keyboard
-                            )
-                        except Exception as photo_err:
-                            LOGGER.error(f"Failed to send photo: {photo_err}")
-                            await status.edit_text(text, reply_markup=keyboard)
-                    else:
-                        await status.edit_text(text, reply_markup=keyboard)
-                elif response.status == 404:
-                    await status.edit_text(f"❌ No Wikipedia page found for '{query}'!")
-                else:
-                    await status.edit_text(f"❌ Error searching Wikipedia (Status: {response.status})")
+        status_code, data = await fetch_wiki(query)
+        if status_code == 200:
+            # Check if the page type is valid (not a disambiguation or missing page)
+            page_type = data.get('type', '')
+            if page_type == 'disambiguation':
+                await status.edit_text(f"❌ '{query}' is a disambiguation page. Please be more specific!")
+                return
+            
+            title = data.get('title', 'Not Found')
+            extract = data.get('extract', 'No information available.')
+            page_url = data.get('content_urls', {}).get('desktop', {}).get('page', '')
+            thumbnail = data.get('thumbnail', {}).get('source', '')
+            
+            # Check if we got meaningful content
+            if not extract or not extract.strip():
+                await status.edit_text(f"❌ No information found for '{query}'!")
+                return
+            
+            text = f"📚 **Wikipedia - {title}**\n\n{extract}"
+            
+            if len(text) > 4096:
+                text = text[:4090] + "..."
+            
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("📖 Read More", url=page_url)]
+            ]) if page_url else None
+            
+            if thumbnail:
+                try:
+                    await status.delete()
+                    await message.reply_photo(
+                        thumbnail,
+                        caption=text,
+                        reply_markup=keyboard
+                    )
+                except Exception as photo_err:
+                    LOGGER.error(f"Failed to send photo: {photo_err}")
+                    await status.edit_text(text, reply_markup=keyboard)
+            else:
+                await status.edit_text(text, reply_markup=keyboard)
+        elif status_code == 404:
+            await status.edit_text(f"❌ No Wikipedia page found for '{query}'!")
+        else:
+            await status.edit_text(f"❌ Error searching Wikipedia (Status: {status_code})")
         
+    except UpstreamUnavailable as e:
+        await status.edit_text(f"❌ {str(e)}")
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
         LOGGER.error(f"Wiki search error: {e}")
@@ -131,40 +280,45 @@ async def youtube_search(client: Client, message: Message):
 
 @Client.on_message(filters.command("tr"))
 async def translate_text(client: Client, message: Message):
-    """Translate text using Google Translate"""
+    """Translate text, or the replied-to message's text/caption, using Google Translate"""
     try:
-        if len(message.command) < 3:
+        replied = message.reply_to_message
+        source_text = replied and (replied.text or replied.caption)
+        if source_text:
+            # /tr [language_code] as a reply; defaults to English
+            target_lang = message.command[1] if len(message.command) > 1 else "en"
+            text_to_translate = source_text
+        elif len(message.command) < 3:
             await message.reply_text(
-                "❌ Usage: /tr [language_code] [text]\n\n"
+                "❌ Usage: /tr [language_code] [text]\n"
+                "Or reply to a message with /tr [language_code]\n\n"
                 "Example: /tr es Hello World\n\n"
                 "Common codes: en, es, fr, de, it, pt, ru, ja, ko, zh"
             )
             return
+        else:
+            target_lang = message.command[1]
+            text_to_translate = " ".join(message.command[2:])
         
-        target_lang = message.command[1]
-        text_to_translate = " ".join(message.command[2:])
-        
-        # Simple translation API (you can use Google Translate API for better results)
-        url = f"https://translate.googleapis.com/translate_a/single?client=gtx&sl=auto&tl={target_lang}&dt=t&q={urllib.parse.quote(text_to_translate)}"
+        status_code, translated = await fetch_translation(text_to_translate, target_lang)
+        if status_code != 200:
+            await message.reply_text("❌ Translation failed!")
+            return
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    translated = ""
-                    for item in data[0]:
-                        if item[0]:
-                            translated += item[0]
-                    
-                    await message.reply_text(
-                        f"🌐 **Translation**\n\n"
-                        f"**Original:** {text_to_translate}\n\n"
-                        f"**Translated ({target_lang}):** {translated}"
-                    )
-                else:
-                    await message.reply_text("❌ Translation failed!")
+        if source_text:
+            text = f"🌐 **Translated ({target_lang}):**\n\n{translated}"
+        else:
+            text = (
+                f"🌐 **Translation**\n\n"
+                f"**Original:** {text_to_translate}\n\n"
+                f"**Translated ({target_lang}):** {translated}"
+            )
+        # Long translations go out in several messages
+        for offset in range(0, len(text), 4096):
+            await message.reply_text(text[offset:offset + 4096])
         
+    except UpstreamUnavailable as e:
+        await message.reply_text(f"❌ {str(e)}")
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
         LOGGER.error(f"Translation error: {e}")
@@ -219,46 +373,17 @@ async def define_word(client: Client, message: Message):
             await message.reply_text("❌ Usage: /define [word]")
             return
         
-        word = message.command[1]
-        
-        # Dictionary API
-        url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}"
+        word = message.command[1].lower()
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if data:
-                        entry = data[0]
-                        word_text = entry.get('word', word).capitalize()
-                        phonetic = entry.get('phonetic', '')
-                        
-                        text = f"📖 **{word_text}**"
-                        if phonetic:
-                            text += f" _{phonetic}_"
-                        text += "\n\n"
-                        
-                        meanings = entry.get('meanings', [])
-                        for i, meaning in enumerate(meanings[:3], 1):  # Limit to 3
-                            part_of_speech = meaning.get('partOfSpeech', '')
-                            definitions = meaning.get('definitions', [])
-                            
-                            if definitions:
-                                text += f"**{part_of_speech.capitalize()}:**\n"
-                                for j, definition in enumerate(definitions[:2], 1):  # Limit to 2
-                                    def_text = definition.get('definition', '')
-                                    text += f"{j}. {def_text}\n"
-                                    
-                                    example = definition.get('example')
-                                    if example:
-                                        text += f"   _Example: {example}_\n"
-                                text += "\n"
-                        
-                        await message.reply_text(text)
-                else:
-                    await message.reply_text(f"❌ Could not find definition for '{word}'")
+        status_code, entry = await fetch_definition(word)
+        if status_code == 200:
+            if entry:
+                await message.reply_text(format_definition(entry, word))
+        else:
+            await message.reply_text(f"❌ Could not find definition for '{word}'")
         
+    except UpstreamUnavailable as e:
+        await message.reply_text(f"❌ {str(e)}")
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
         LOGGER.error(f"Define error: {e}")
\ No newline at end of file
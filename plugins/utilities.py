@@ -2,30 +2,35 @@
 Utility commands - ping, status, notes, filters, etc.
 """
 from pyrogram import Client, filters
+from pyrogram.enums import ChatType
 from pyrogram.types import Message
-from database import Database
+from database import db
+from admin_cache import admin_cache
+from plugins.antiflood import flood_tracker, raid_guard
+from plugins.welcome import join_debouncer
+from outbox import outbox
+from broadcast import broadcaster
+from http_client import http_client
+from upstream import upstreams
+from dictionary import offline_dictionary
+from afk_index import afk_index
 from logger import LOGGER
+import asyncio
 import time
 import psutil
 import platform
 from datetime import datetime
 
-db = Database()
-
-# Cache bot username to avoid repeated API calls
-_bot_username = None
-
-async def get_bot_username(client: Client) -> str:
-    """Get and cache bot username"""
-    global _bot_username
-    if _bot_username is None:
-        me = await client.get_me()
-        _bot_username = me.username
-    return _bot_username
-
 @Client.on_message(filters.command("start"))
 async def start_command(client: Client, message: Message):
     """Start command"""
+    if message.from_user:
+        # Users who started the bot are broadcast targets
+        await db.add_user(message.from_user.id, message.from_user.username, message.from_user.first_name)
+        if message.chat.type == ChatType.PRIVATE:
+            # Only a private /start proves the bot can reach them again after a block
+            await db.mark_chat_alive(message.from_user.id)
+    
     text = f"""
 👋 **Hello {message.from_user.first_name}!**
 
@@ -97,6 +102,7 @@ async def help_command(client: Client, message: Message):
 
 **🛡️ Protection:**
 • /antiflood [on/off] - Anti-flood
+• /endraid - End a raid lockdown
 • /blacklist [word] - Blacklist words
 • /rmblacklist [word] - Remove from blacklist
 • /getblacklist - Show blacklist
@@ -149,6 +155,70 @@ async def status_command(client: Client, message: Message):
 🐍 **Python:** {platform.python_version()}
 """
         
+        cache_stats = db.cache_stats()
+        text += "\n🗄️ **Settings Cache:**\n"
+        for name, stats in cache_stats.items():
+            text += (
+                f"• {name.capitalize()}: {stats['hit_ratio'] * 100:.1f}% hits, "
+                f"{stats['size']} cached, {stats['evictions']} evicted\n"
+            )
+        
+        flood_stats = flood_tracker.stats()
+        text += (
+            f"\n🌊 **Flood Tracker:** {flood_stats['users']} users in {flood_stats['chats']} chats "
+            f"({flood_stats['configured']} configured), "
+            f"~{flood_stats['bytes'] / 1024:.0f} KB\n"
+        )
+        
+        raid_stats = raid_guard.stats()
+        text += (
+            f"🚨 **Raids:** {raid_stats['raids']} detected, {raid_stats['locked']} locked now, "
+            f"{raid_stats['handled']} raiders handled\n"
+        )
+        
+        join_stats = join_debouncer.stats()
+        text += (
+            f"👋 **Welcomes:** {join_stats['welcomes']} sent for {join_stats['joins']} joins, "
+            f"{join_stats['pending']} pending\n"
+        )
+        
+        send_stats = outbox.stats()
+        queued = ", ".join(f"{name} {depth}" for name, depth in send_stats["queued"].items())
+        text += (
+            f"\n📤 **Outbox:** {send_stats['granted']} sent, {send_stats['flood_waits']} FloodWaits, "
+            f"{send_stats['dropped']} dropped\n"
+            f"• Queued: {queued}\n"
+            f"• Wait: avg {send_stats['wait_avg'] * 1000:.0f} ms, p95 {send_stats['wait_p95'] * 1000:.0f} ms, "
+            f"max {send_stats['wait_max'] * 1000:.0f} ms\n"
+        )
+        
+        http_stats = http_client.stats()
+        if http_stats:
+            text += "\n🌐 **HTTP:**\n"
+            for endpoint, stats in http_stats.items():
+                text += (
+                    f"• {endpoint}: {stats['requests']} requests, {stats['errors']} errors, "
+                    f"p50 {stats['p50'] * 1000:.0f} ms, p95 {stats['p95'] * 1000:.0f} ms\n"
+                )
+        
+        text += "\n🔎 **Search Cache:**\n"
+        for endpoint, stats in upstreams.stats().items():
+            text += (
+                f"• {endpoint}: {stats['hit_ratio'] * 100:.1f}% hits "
+                f"({stats['memory_hits']} memory, {stats['disk_hits']} disk), "
+                f"{stats['fetches']} fetched, {stats['coalesced']} coalesced, {stats['size']} cached\n"
+                f"  breaker {stats['breaker']}"
+                + (f" (retry in {stats['retry_in']:.0f}s)" if stats['retry_in'] else "")
+                + f", {stats['hedges']} hedged, {stats['rejected']} rejected\n"
+            )
+        
+        if offline_dictionary.available:
+            dict_stats = offline_dictionary.stats()
+            text += (
+                f"\n📖 **Offline Dictionary:** {dict_stats['words']} words, "
+                f"{dict_stats['hits']} hits, {dict_stats['misses']} misses\n"
+            )
+        
         await message.reply_text(text)
         
     except Exception as e:
@@ -244,7 +314,7 @@ async def set_afk(client: Client, message: Message):
     """Set AFK status"""
     try:
         reason = " ".join(message.command[1:]) if len(message.command) > 1 else None
-        await db.set_afk(message.from_user.id, reason)
+        await afk_index.set(message.from_user, reason)
         
         afk_text = f"💤 {message.from_user.first_name} is now AFK"
         if reason:
@@ -255,39 +325,36 @@ async def set_afk(client: Client, message: Message):
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
 
-@Client.on_message(filters.text & filters.group, group=1)
-async def check_afk(client: Client, message: Message):
-    """Check if mentioned user is AFK"""
-    try:
-        # Skip if this is the /afk command itself
-        if message.text:
-            bot_username = await get_bot_username(client)
-            first_word = message.text.split()[0]
-            if first_word in ["/afk", f"/afk@{bot_username}"]:
-                return
-        
-        # Check if sender was AFK
-        sender_afk = await db.is_afk(message.from_user.id)
-        if sender_afk:
-            await db.remove_afk(message.from_user.id)
-            await message.reply_text(
-                f"👋 Welcome back {message.from_user.first_name}! "
-                f"You are no longer AFK."
-            )
-            return  # Exit to avoid checking reply-to AFK status
-        
-        # Check if replied user is AFK (only if sender wasn't AFK)
-        if message.reply_to_message and message.reply_to_message.from_user:
-            user_id = message.reply_to_message.from_user.id
-            afk_data = await db.is_afk(user_id)
-            if afk_data:
-                afk_text = f"💤 {message.reply_to_message.from_user.first_name} is AFK"
-                if afk_data.get("reason"):
-                    afk_text += f"\n📝 Reason: {afk_data['reason']}"
-                await message.reply_text(afk_text)
-        
-    except Exception as e:
-        LOGGER.error(f"AFK check error: {e}")
+async def afk_stage(client: Client, ctx) -> bool:
+    """Moderation pipeline stage: AFK return notices, and notices for replies to or mentions of AFK users"""
+    message = ctx.message
+    if not message.text or not afk_index:
+        return False  # Nobody is AFK: no lookups at all
+    
+    # Skip the /afk command itself (it has just set the sender AFK)
+    if message.text.split(maxsplit=1)[0].split("@")[0].lower() == "/afk":
+        return False
+    
+    # Check if sender was AFK
+    if await afk_index.remove(ctx.user_id):
+        await message.reply_text(
+            f"👋 Welcome back {message.from_user.first_name}! "
+            f"You are no longer AFK."
+        )
+        return False  # Skip the reply-to AFK check
+    
+    # Check if the replied-to or mentioned users are AFK (only if sender wasn't AFK)
+    notices = []
+    for afk_data in afk_index.mentioned(message):
+        name = afk_data.get("first_name") or afk_data.get("username") or "This user"
+        afk_text = f"💤 {name} is AFK"
+        if afk_data.get("reason"):
+            afk_text += f"\n📝 Reason: {afk_data['reason']}"
+        notices.append(afk_text)
+    if notices:
+        await message.reply_text("\n\n".join(notices))
+    
+    return False
 
 @Client.on_message(filters.command("dice"))
 async def roll_dice(client: Client, message: Message):
@@ -333,33 +400,20 @@ async def broadcast_message(client: Client, message: Message):
         await message.reply_text("❌ Reply to a message to broadcast!")
         return
     
-    sent = 0
-    failed = 0
-    
     status_msg = await message.reply_text("📡 Broadcasting...")
-    
-    async for dialog in client.get_dialogs():
-        try:
-            await message.reply_to_message.copy(dialog.chat.id)
-            sent += 1
-        except:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"✅ Broadcast complete!\n"
-        f"📤 Sent: {sent}\n"
-        f"❌ Failed: {failed}"
-    )
+    try:
+        # Runs in the background; status_msg is edited with live progress
+        await broadcaster.start(client, message.reply_to_message, status_msg)
+    except Exception as e:
+        await status_msg.edit_text(f"❌ Error: {str(e)}")
+        LOGGER.error(f"Broadcast error: {e}")
 
 @Client.on_message(filters.command("blacklist") & filters.group)
 async def add_blacklist(client: Client, message: Message):
     """Add word to blacklist"""
-    from pyrogram.enums import ChatMemberStatus
-    
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -378,12 +432,9 @@ async def add_blacklist(client: Client, message: Message):
 @Client.on_message(filters.command("rmblacklist") & filters.group)
 async def remove_blacklist(client: Client, message: Message):
     """Remove word from blacklist"""
-    from pyrogram.enums import ChatMemberStatus
-    
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -420,46 +471,28 @@ async def show_blacklist(client: Client, message: Message):
         await message.reply_text(f"❌ Error: {str(e)}")
         LOGGER.error(f"Get blacklist error: {e}")
 
-@Client.on_message((filters.text | filters.caption) & filters.group, group=2)
-async def check_blacklist(client: Client, message: Message):
-    """Check and delete messages with blacklisted words"""
-    from pyrogram.enums import ChatMemberStatus
-    import asyncio
-    import re
+async def blacklist_stage(client: Client, ctx) -> bool:
+    """Moderation pipeline stage: delete messages with blacklisted words; True if deleted"""
+    # Skip admins and chats without a blacklist
+    if ctx.is_admin or not ctx.blacklist or not ctx.text:
+        return False
+    
+    # Compiled per chat; matches whole words only to avoid false positives
+    if ctx.blacklist.search(ctx.text) is None:
+        return False
     
+    message = ctx.message
     try:
-        # Skip if from admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-            return
-        
-        # Get blacklist
-        blacklist = await db.get_blacklist(message.chat.id)
-        
-        if not blacklist:
-            return
-        
-        # Check if message contains blacklisted words
-        message_text = (message.text or message.caption or "").lower()
-        
-        for word in blacklist:
-            # Use word boundary matching to avoid false positives
-            pattern = r'\b' + re.escape(word) + r'\b'
-            if re.search(pattern, message_text):
-                try:
-                    await message.delete()
-                    warn_msg = await message.reply_text(
-                        f"⚠️ {message.from_user.mention}, your message was deleted "
-                        f"because it contains a blacklisted word!"
-                    )
-                    # Auto-delete warning after 5 seconds (non-blocking)
-                    asyncio.create_task(self_delete_message(warn_msg))
-                except Exception as del_err:
-                    LOGGER.error(f"Error deleting blacklisted message: {del_err}")
-                break
-        
-    except Exception as e:
-        LOGGER.error(f"Blacklist check error: {e}")
+        await message.delete()
+        warn_msg = await message.reply_text(
+            f"⚠️ {message.from_user.mention}, your message was deleted "
+            f"because it contains a blacklisted word!"
+        )
+        # Auto-delete warning after 5 seconds (non-blocking)
+        asyncio.create_task(self_delete_message(warn_msg))
+    except Exception as del_err:
+        LOGGER.error(f"Error deleting blacklisted message: {del_err}")
+    return True
 
 async def self_delete_message(message):
     """Helper function to auto-delete message after delay"""
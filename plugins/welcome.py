@@ -1,73 +1,215 @@
 """
 Welcome and goodbye messages plugin
 """
+import asyncio
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
 from pyrogram import Client, filters
-from pyrogram.types import Message
-from pyrogram.enums import ChatMemberStatus
-from database import Database
+from pyrogram.types import Chat, Message, User
+from cache import TTLCache
+from config import Config
+from database import db
+from admin_cache import admin_cache
 from logger import LOGGER
+from plugins.antiflood import raid_guard
 
-db = Database()
+DEFAULT_WELCOME_TEXT = "Welcome {mention} to {chat}! 👋"
 
-def format_welcome(text, user, chat):
-    """Format welcome message with variables"""
-    replacements = {
-        "{mention}": user.mention,
-        "{first}": user.first_name,
-        "{last}": user.last_name or "",
-        "{username}": f"@{user.username}" if user.username else user.first_name,
-        "{id}": str(user.id),
-        "{chat}": chat.title,
-        "{chatid}": str(chat.id),
-        "{count}": "members"  # You can get actual count if needed
-    }
+TEMPLATE_VARIABLES = ("mention", "first", "last", "username", "id", "chat", "chatid", "count")
+TEMPLATE_TOKEN = re.compile(r"\{(" + "|".join(TEMPLATE_VARIABLES) + r")\}")
+
+class WelcomeTemplate:
+    """A welcome/goodbye text split once into literal runs and the variables between them"""
+    __slots__ = ("literals", "variables")
     
-    for key, value in replacements.items():
-        text = text.replace(key, str(value))
+    def __init__(self, text: str):
+        parts = TEMPLATE_TOKEN.split(text)
+        self.literals = tuple(parts[0::2])  # always one more than variables
+        self.variables = tuple(parts[1::2])
     
-    return text
+    @property
+    def uses_count(self) -> bool:
+        return "count" in self.variables
+    
+    def render(self, values: Dict[str, str]) -> str:
+        """Fill every variable in one pass (substituted values are never re-scanned)"""
+        out = [self.literals[0]]
+        for name, literal in zip(self.variables, self.literals[1:]):
+            out.append(values[name])
+            out.append(literal)
+        return "".join(out)
 
-@Client.on_message(filters.new_chat_members & filters.group)
-async def welcome_new_member(client: Client, message: Message):
-    """Send welcome message to new members"""
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> WelcomeTemplate:
+    """Compiled template for a text; each chat's text is parsed once, however many joins"""
+    return WelcomeTemplate(text)
+
+class MemberCounts:
+    """Member count per chat for {count}: fetched once, then moved by join and leave events
+    
+    Entries expire after `resync` seconds, which bounds drift from missed events.
+    """
+    
+    def __init__(self, resync: float = 3600, max_chats: int = 10000):
+        self._counts = TTLCache(max_chats, resync)
+    
+    async def get(self, client: Client, chat_id: int) -> int:
+        count = self._counts.get(chat_id)
+        if count is None:
+            count = await client.get_chat_members_count(chat_id)
+            self._counts.set(chat_id, count)
+        return count
+    
+    def adjust(self, chat_id: int, delta: int):
+        """Apply joins (+) or leaves (-) to a known count; unknown chats are fetched on demand"""
+        count = self._counts.get(chat_id, count=False)
+        if count is not None:
+            self._counts.update(chat_id, max(0, count + delta))
+
+member_counts = MemberCounts()
+
+def _user_values(user) -> Dict[str, str]:
+    """The per-user template variables"""
+    return {
+        "mention": user.mention,
+        "first": user.first_name,
+        "last": user.last_name or "",
+        "username": f"@{user.username}" if user.username else user.first_name,
+        "id": str(user.id),
+    }
+
+def _chat_values(chat, count: Optional[int]) -> Dict[str, str]:
+    return {
+        "chat": chat.title or "",
+        "chatid": str(chat.id),
+        "count": str(count) if count is not None else "members",
+    }
+
+async def template_count(client: Client, chat_id: int, template: WelcomeTemplate) -> Optional[int]:
+    """The chat's member count if the template shows it, else None (no lookup)"""
+    if not template.uses_count:
+        return None
     try:
-        # Get welcome message and check if enabled
-        welcome_data = await db.get_welcome(message.chat.id)
+        return await member_counts.get(client, chat_id)
+    except Exception as e:
+        LOGGER.warning(f"Member count unavailable for {chat_id}: {e}")
+        return None
+
+def format_welcome(text, user, chat, count: Optional[int] = None):
+    """Format welcome message with variables"""
+    return compile_template(text).render({**_user_values(user), **_chat_values(chat, count)})
+
+def format_welcome_many(text: str, users: List[User], chat, max_mentions: int, count: Optional[int] = None) -> str:
+    """Format one welcome for several users: each user variable lists the first max_mentions of them"""
+    if len(users) == 1:
+        return format_welcome(text, users[0], chat, count)
+    shown = [_user_values(user) for user in users[:max_mentions]]
+    hidden = len(users) - len(shown)
+    values = _chat_values(chat, count)
+    for key in shown[0]:
+        joined = ", ".join(user[key] for user in shown if user[key])
+        if hidden and key != "last":
+            joined += f" and {hidden} more"
+        values[key] = joined
+    return compile_template(text).render(values)
+
+class JoinDebouncer:
+    """Welcomes each chat's joins once per window instead of once per member
+    
+    The first join in a quiet chat opens a window of `window` seconds; everyone
+    who joins before it closes is welcomed by one message, so a mass join costs
+    one message per window rather than one per member. The chat's previous
+    welcome is deleted when the next one is posted.
+    """
+    
+    def __init__(self, window: float = 3, max_mentions: int = 10):
+        self.window = window
+        self.max_mentions = max_mentions
+        self._pending: Dict[int, Dict[int, User]] = {}  # chat_id -> joined users, in join order
+        self._last_welcome: Dict[int, int] = {}  # chat_id -> id of the welcome message on screen
+        self._tasks: Set[asyncio.Task] = set()
+        self.joins = 0
+        self.welcomes = 0
+    
+    def add(self, client: Client, chat: Chat, users: List[User]):
+        """Queue joined users; the chat's welcome goes out when its window closes"""
+        pending = self._pending.get(chat.id)
+        if pending is None:
+            pending = self._pending[chat.id] = {}
+            task = asyncio.ensure_future(self._flush_later(client, chat))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        for user in users:
+            pending[user.id] = user
+        self.joins += len(users)
+    
+    async def _flush_later(self, client: Client, chat: Chat):
+        await asyncio.sleep(self.window)
+        users = list(self._pending.pop(chat.id, {}).values())
+        if not users:
+            return
+        try:
+            await self._welcome(client, chat, users)
+        except Exception as e:
+            LOGGER.error(f"Welcome error in {chat.id}: {e}")
+    
+    async def _welcome(self, client: Client, chat: Chat, users: List[User]):
+        if raid_guard.locked(chat.id):
+            return  # A raid started during the window: no welcome, no writes for the raiders
+        
+        # Register the whole window's members in one write, whatever is shown
+        await db.add_users_many([(user.id, user.username, user.first_name) for user in users])
         
-        # Check if welcome is enabled (default to True if no settings)
+        # Settings are read at send time, so a /welcome off during the window applies
+        welcome_data = await db.get_welcome(chat.id)
         if welcome_data and not welcome_data.get("welcome_enabled", True):
             return
+        welcome_text = (welcome_data or {}).get("welcome_text") or DEFAULT_WELCOME_TEXT
         
-        if welcome_data and welcome_data.get("welcome_text"):
-            welcome_text = welcome_data["welcome_text"]
-        else:
-            welcome_text = "Welcome {mention} to {chat}! 👋"
+        count = await template_count(client, chat.id, compile_template(welcome_text))
+        formatted_text = format_welcome_many(welcome_text, users, chat, self.max_mentions, count)
         
-        # Send welcome to each new member
-        for user in message.new_chat_members:
-            if user.is_bot:
-                continue  # Skip bots
-            
-            formatted_text = format_welcome(welcome_text, user, message.chat)
-            
-            # Ensure the formatted text is not empty
-            if not formatted_text or not formatted_text.strip():
-                formatted_text = f"Welcome {user.mention}!"
-            
-            # Send with photo if available
-            if welcome_data and welcome_data.get("photo"):
-                try:
-                    await message.reply_photo(
-                        welcome_data["photo"],
-                        caption=formatted_text
-                    )
-                except:
-                    await message.reply_text(formatted_text)
-            else:
-                await message.reply_text(formatted_text)
-            
-            # Add user to database
-            await db.add_user(user.id, user.username, user.first_name)
+        # Ensure the formatted text is not empty
+        if not formatted_text or not formatted_text.strip():
+            formatted_text = format_welcome_many(DEFAULT_WELCOME_TEXT, users, chat, self.max_mentions)
+        
+        # Send with photo if available
+        sent = None
+        if welcome_data and welcome_data.get("photo"):
+            try:
+                sent = await client.send_photo(chat.id, welcome_data["photo"], caption=formatted_text)
+            except Exception:
+                sent = None
+        if sent is None:
+            sent = await client.send_message(chat.id, formatted_text)
+        self.welcomes += 1
+        
+        # Keep only the latest welcome on screen
+        previous = self._last_welcome.get(chat.id)
+        self._last_welcome[chat.id] = sent.id
+        if previous is not None:
+            try:
+                await client.delete_messages(chat.id, previous)
+            except Exception as e:
+                LOGGER.warning(f"Could not delete previous welcome in {chat.id}: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        return {"joins": self.joins, "welcomes": self.welcomes, "pending": sum(map(len, self._pending.values()))}
+
+# Shared by the join handler; /status reads its counters
+join_debouncer = JoinDebouncer(Config.WELCOME_WINDOW, Config.WELCOME_MAX_MENTIONS)
+
+@Client.on_message(filters.new_chat_members & filters.group)
+async def welcome_new_member(client: Client, message: Message):
+    """Queue new members for the chat's next aggregated welcome"""
+    try:
+        member_counts.adjust(message.chat.id, len(message.new_chat_members))
+        if raid_guard.locked(message.chat.id):
+            return  # Raid lockdown: raiders get no welcome
+        users = [user for user in message.new_chat_members if not user.is_bot]  # Skip bots
+        if users:
+            join_debouncer.add(client, message.chat, users)
         
     except Exception as e:
         LOGGER.error(f"Welcome error: {e}")
@@ -76,6 +218,8 @@ async def welcome_new_member(client: Client, message: Message):
 async def goodbye_member(client: Client, message: Message):
     """Send goodbye message when member leaves"""
     try:
+        member_counts.adjust(message.chat.id, -1)
+        
         # Check if goodbye is enabled
         goodbye_data = await db.get_welcome(message.chat.id)
         
@@ -88,7 +232,8 @@ async def goodbye_member(client: Client, message: Message):
             return
         
         goodbye_text = goodbye_data.get("goodbye_text", "Goodbye {mention}! 👋")
-        formatted_text = format_welcome(goodbye_text, user, message.chat)
+        count = await template_count(client, message.chat.id, compile_template(goodbye_text))
+        formatted_text = format_welcome(goodbye_text, user, message.chat, count)
         
         await message.reply_text(formatted_text)
         
@@ -100,8 +245,7 @@ async def set_welcome(client: Client, message: Message):
     """Set custom welcome message"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -129,7 +273,8 @@ async def set_welcome(client: Client, message: Message):
                     "• {username} - Username\n"
                     "• {id} - User ID\n"
                     "• {chat} - Chat name\n"
-                    "• {chatid} - Chat ID"
+                    "• {chatid} - Chat ID\n"
+                    "• {count} - Member count"
                 )
                 return
             
@@ -139,9 +284,10 @@ async def set_welcome(client: Client, message: Message):
         # Save to database
         await db.set_welcome(message.chat.id, welcome_text, photo_id)
         
+        count = await template_count(client, message.chat.id, compile_template(welcome_text))
         await message.reply_text(
             f"✅ Welcome message set!\n\n"
-            f"**Preview:**\n{format_welcome(welcome_text, message.from_user, message.chat)}"
+            f"**Preview:**\n{format_welcome(welcome_text, message.from_user, message.chat, count)}"
         )
         
     except Exception as e:
@@ -153,8 +299,7 @@ async def set_goodbye(client: Client, message: Message):
     """Set custom goodbye message"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -167,9 +312,10 @@ async def set_goodbye(client: Client, message: Message):
         # Save to database
         await db.set_goodbye(message.chat.id, goodbye_text)
         
+        count = await template_count(client, message.chat.id, compile_template(goodbye_text))
         await message.reply_text(
             f"✅ Goodbye message set!\n\n"
-            f"**Preview:**\n{format_welcome(goodbye_text, message.from_user, message.chat)}"
+            f"**Preview:**\n{format_welcome(goodbye_text, message.from_user, message.chat, count)}"
         )
         
     except Exception as e:
@@ -180,8 +326,7 @@ async def toggle_welcome(client: Client, message: Message):
     """Toggle welcome messages on/off"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
@@ -228,8 +373,7 @@ async def reset_welcome(client: Client, message: Message):
     """Reset welcome message to default"""
     try:
         # Check if admin
-        member = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+        if not await admin_cache.is_sender_admin(client, message):
             await message.reply_text("❌ You need to be an admin to use this command!")
             return
         
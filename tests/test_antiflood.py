@@ -0,0 +1,85 @@
+"""
+Anti-flood stage and tracker
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from pyrogram import raw, utils
+from plugins.antiflood import FloodTracker, flood_stage, flood_tracker
+
+class RecordingClient:
+    """Serialises the ChatBannedRights Pyrogram would send, so a bad until_date fails here too"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _record(self, action, user_id, until_date):
+        raw.types.ChatBannedRights(until_date=utils.datetime_to_timestamp(until_date), send_messages=True).write()
+        self.calls.append((action, user_id, until_date))
+
+    async def ban_chat_member(self, chat_id, user_id, until_date=utils.zero_datetime()):
+        self._record("ban", user_id, until_date)
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions, until_date=utils.zero_datetime()):
+        self._record("mute", user_id, until_date)
+
+class FakeMessage:
+    def __init__(self, user_id):
+        self.from_user = SimpleNamespace(id=user_id, mention=f"user {user_id}")
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+def flood(chat_id, action, duration):
+    """Send threshold + 1 messages from one user and return what the stage did"""
+    chat = {
+        "antiflood": 1, "flood_threshold": 2, "flood_timeframe": 10,
+        "flood_action": action, "flood_duration": duration,
+    }
+    client = RecordingClient()
+    ctx = SimpleNamespace(is_admin=False, chat=chat, chat_id=chat_id, user_id=7, message=FakeMessage(7))
+
+    async def run():
+        return [await flood_stage(client, ctx) for _ in range(3)]
+
+    try:
+        return asyncio.run(run()), client, ctx.message
+    finally:
+        flood_tracker.forget_chat(chat_id)
+
+def test_zero_duration_mutes_forever():
+    acted, client, message = flood(-1001, "mute", 0)
+    assert acted == [False, False, True]
+    assert client.calls == [("mute", 7, utils.zero_datetime())]
+    assert "muted for flooding" in message.replies[0]
+
+def test_zero_duration_bans_forever():
+    acted, client, _ = flood(-1002, "ban", 0)
+    assert acted[-1]
+    assert client.calls == [("ban", 7, utils.zero_datetime())]
+
+def test_timed_mute_sets_until_date():
+    _, client, message = flood(-1003, "mute", 600)
+    assert client.calls[0][2] > utils.zero_datetime().replace(tzinfo=None)
+    assert "muted for 10 minutes" in message.replies[0]
+
+def test_threshold_change_keeps_user_most_recent():
+    tracker = FloodTracker(max_users=3)
+    for user_id in (1, 2, 3):
+        tracker.hit(1, user_id, 5, 10)
+    # /setflood lowered the threshold; user 1 keeps messaging, then a new user arrives
+    tracker.hit(1, 1, 3, 10)
+    tracker.hit(1, 4, 3, 10)
+    assert list(tracker._users) == [(1, 3), (1, 1), (1, 4)]
+    assert len(tracker._users[(1, 1)]) == 2
+
+def test_sweep_reaches_past_resized_entries():
+    tracker = FloodTracker(idle_after=10)
+    tracker.hit(1, 1, 5, 10)
+    tracker.hit(1, 2, 5, 10)
+    tracker.hit(1, 1, 3, 10)
+    # Only user 2 is idle at this point; it must be reached first
+    tracker._users[(1, 2)][-1] -= 60
+    tracker.sweep(time.monotonic(), tracker.idle_after)
+    assert list(tracker._users) == [(1, 1)]
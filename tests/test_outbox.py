@@ -0,0 +1,43 @@
+"""
+Outbox wait bounds
+"""
+import asyncio
+import time
+import pytest
+from outbox import OutboxBusy, Priority, Route, SendScheduler
+
+def test_normal_lane_refuses_a_backlog_longer_than_its_bound():
+    async def run():
+        scheduler = SendScheduler(group_per_minute=60, group_burst=1, max_normal_wait=2.5)
+        route = Route(Priority.NORMAL, -100, False)
+        granted = [asyncio.ensure_future(scheduler.acquire(route)) for _ in range(3)]
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(OutboxBusy):
+            await scheduler.acquire(route)
+        refused_after = time.monotonic() - started
+        # Moderation has no bound and another chat is unaffected
+        await scheduler.acquire(Route(Priority.MODERATION, None, False))
+        await scheduler.acquire(Route(Priority.NORMAL, -200, False))
+        await asyncio.gather(*granted)
+        await scheduler.stop()
+        return refused_after, scheduler.stats()
+
+    refused_after, stats = asyncio.run(run())
+    assert refused_after < 0.1
+    assert stats["dropped"] == 1
+
+def test_normal_lane_gives_up_after_its_bound():
+    async def run():
+        scheduler = SendScheduler(max_normal_wait=0.2)
+        scheduler.penalize(Route(Priority.MODERATION, None, False), 5)
+        started = time.monotonic()
+        with pytest.raises(OutboxBusy):
+            await scheduler.acquire(Route(Priority.NORMAL, -100, False))
+        waited = time.monotonic() - started
+        await scheduler.stop()
+        return waited, scheduler.stats()
+
+    waited, stats = asyncio.run(run())
+    assert 0.2 <= waited < 1
+    assert stats["dropped"] == 1 and stats["queued"]["normal"] == 0
@@ -0,0 +1,38 @@
+"""
+/purge batching
+"""
+import asyncio
+from pyrogram.errors import FloodWait
+from plugins.admin import PURGE_CHUNK, purge_range
+
+class DeletingClient:
+    """Deletes every id it is given until call number `flood_at`, which raises FloodWait"""
+
+    def __init__(self, flood_at=None, wait=3600):
+        self.flood_at = flood_at
+        self.wait = wait
+        self.calls = 0
+
+    async def delete_messages(self, chat_id, ids):
+        self.calls += 1
+        if self.calls == self.flood_at:
+            raise FloodWait(value=self.wait)
+        await asyncio.sleep(0)
+        return len(ids)
+
+def test_purge_deletes_every_chunk():
+    client = DeletingClient()
+    deleted, flood_wait = asyncio.run(purge_range(client, -100, 1, PURGE_CHUNK * 10))
+    assert (deleted, flood_wait) == (PURGE_CHUNK * 10, 0)
+    assert client.calls == 10
+
+def test_purge_stops_on_flood_wait_instead_of_sleeping():
+    client = DeletingClient(flood_at=3)
+
+    async def run():
+        return await asyncio.wait_for(purge_range(client, -100, 1, PURGE_CHUNK * 50), timeout=5)
+
+    deleted, flood_wait = asyncio.run(run())
+    assert flood_wait == 3600
+    assert client.calls < 50
+    assert deleted == PURGE_CHUNK * (client.calls - 1)
@@ -0,0 +1,93 @@
+"""
+Build the offline dictionary used by /define (see dictionary.py)
+
+Reads JSON Lines in either of two shapes, one object per line:
+    - Wiktionary extracts from wiktextract/kaikki.org: {"word", "pos", "senses": [...], ...}
+    - dictionaryapi.dev entries: {"word", "phonetic", "meanings": [...]}
+Wiktionary lines for the same word (one per part of speech) are merged into one entry.
+
+Usage:
+    python tools/build_dictionary.py dump.jsonl data/dictionary [--lang en] [--max-definitions 5]
+
+Then set DICTIONARY_PATH=data/dictionary.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dictionary import dictionary_key, write_dictionary  # noqa: E402
+
+def read_lines(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as source:
+        for number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line {number}", file=sys.stderr)
+
+def wiktionary_meaning(record: dict, max_definitions: int) -> dict:
+    """One part of speech from a wiktextract record, in dictionaryapi.dev shape"""
+    definitions = []
+    for sense in record.get("senses", []):
+        glosses = sense.get("glosses") or sense.get("raw_glosses")
+        if not glosses:
+            continue
+        definition = {"definition": glosses[-1]}
+        examples = [example.get("text") for example in sense.get("examples", []) if example.get("text")]
+        if examples:
+            definition["example"] = examples[0]
+        definitions.append(definition)
+        if len(definitions) >= max_definitions:
+            break
+    return {"partOfSpeech": record.get("pos", ""), "definitions": definitions}
+
+def build_entries(path: str, lang: str, max_definitions: int) -> Dict[bytes, dict]:
+    entries: Dict[bytes, dict] = {}
+    for record in read_lines(path):
+        word = record.get("word")
+        if not isinstance(word, str) or not word.strip():
+            continue
+        if "meanings" in record:
+            entries[dictionary_key(word)] = record
+            continue
+        if lang and record.get("lang_code", lang) != lang:
+            continue
+
+        meaning = wiktionary_meaning(record, max_definitions)
+        if not meaning["definitions"]:
+            continue
+        entry = entries.setdefault(dictionary_key(word), {"word": word, "meanings": []})
+        if "phonetic" not in entry:
+            ipa = next((sound["ipa"] for sound in record.get("sounds", []) if sound.get("ipa")), None)
+            if ipa:
+                entry["phonetic"] = ipa
+        entry["meanings"].append(meaning)
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline /define dictionary")
+    parser.add_argument("source", help="JSON Lines dump (.jsonl or .jsonl.gz)")
+    parser.add_argument("output", help="Output path without extension (writes .dat and .idx)")
+    parser.add_argument("--lang", default="en", help="Wiktionary language code to keep ('' for all)")
+    parser.add_argument("--max-definitions", type=int, default=5, help="Definitions kept per part of speech")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    entries = build_entries(args.source, args.lang, args.max_definitions)
+    count = write_dictionary(((entry["word"], entry) for entry in entries.values()), args.output)
+    size = os.path.getsize(args.output + ".dat") + os.path.getsize(args.output + ".idx")
+    print(f"Wrote {count} words ({size / 1024 / 1024:.1f} MB) to {args.output}.dat/.idx "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
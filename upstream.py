@@ -0,0 +1,293 @@
+"""
+Search upstreams
+Cached access to the remote APIs behind /wiki, /tr and /define: an in-memory LRU/TTL
+front with an optional SQLite second tier, per-endpoint TTLs and negative caching of 404s.
+Concurrent misses for the same query share one request, which runs under a latency
+budget, is hedged once it outlasts the endpoint's p95, and is refused outright while
+the endpoint's circuit breaker is open.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+from cache import TTLCache, MISSING
+from config import Config
+from database import db
+from http_client import http_client
+from logger import LOGGER
+
+# Hedging needs this many latency samples before the p95 is trusted
+HEDGE_MIN_SAMPLES = 20
+# Never hedge sooner than this, however fast the endpoint usually is
+HEDGE_FLOOR = 0.05  # seconds
+
+class UpstreamUnavailable(Exception):
+    """The endpoint is failing, too slow or saturated; raised instead of waiting on it"""
+
+    def __init__(self, upstream: "Upstream", reason: str):
+        super().__init__(f"{upstream.label} is not responding right now, please try again later")
+        self.upstream = upstream.name
+        self.reason = reason
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial request through per cooldown"""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_after:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial = False
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                return False  # The trial request is still running
+            self._trial = True
+        return True
+
+    def record(self, ok: bool):
+        if ok:
+            self.failures = 0
+            self.state = self.CLOSED
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.trips += 1
+
+    def release(self):
+        """A request finished (or was cancelled); a half-open breaker may send its next trial"""
+        self._trial = False
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial through (0 otherwise)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_after - (time.monotonic() - self._opened_at))
+
+class Upstream:
+    """Caching policy, latency budget, breaker and counters for one remote endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        ttl: float,
+        negative_ttl: float,
+        maxsize: int,
+        budget: float = 5,
+        max_concurrent: int = 8,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.label = label  # shown to users when the endpoint is unavailable
+        self.ttl = ttl  # seconds a 200 response is reused
+        self.negative_ttl = negative_ttl  # seconds a 404 is remembered
+        self.budget = budget  # seconds a lookup may take, hedge included
+        self.max_concurrent = max_concurrent  # requests in flight before new ones are refused
+        self.breaker = breaker or CircuitBreaker()
+        self.memory = TTLCache(maxsize, ttl)  # key -> (status, data)
+        self.disk_hits = 0
+        self.fetches = 0
+        self.coalesced = 0  # lookups that joined another caller's in-flight request
+        self.hedges = 0
+        self.rejected = 0  # refused by the breaker or the concurrency cap
+        self.active = 0
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before sending a duplicate request (None = don't hedge)"""
+        latency = http_client.latency(self.name)
+        if latency is None or len(latency.recent) < HEDGE_MIN_SAMPLES:
+            return None
+        delay = max(HEDGE_FLOOR, latency.percentile(0.95))
+        return delay if delay < self.budget else None
+
+    def ttl_for(self, status: int) -> Optional[float]:
+        """How long a response with this status may be cached (None = don't cache)"""
+        if status == 200:
+            return self.ttl
+        if status == 404:
+            return self.negative_ttl
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.disk_hits
+        return {
+            "size": memory["size"],
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "fetches": self.fetches,
+            "coalesced": self.coalesced,
+            "hedges": self.hedges,
+            "rejected": self.rejected,
+            "breaker": self.breaker.state,
+            "retry_in": self.breaker.retry_in(),
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+class Upstreams:
+    """Registry of upstream endpoints; fetch() is the only way plugins reach them"""
+
+    def __init__(self, persist: bool = True, disk_max_rows: int = 50000, prune_every: int = 500):
+        self.persist = persist
+        self.disk_max_rows = disk_max_rows
+        self.prune_every = prune_every
+        self._endpoints: Dict[str, Upstream] = {}
+        self._stores = 0
+
+    def register(self, upstream: Upstream):
+        self._endpoints[upstream.name] = upstream
+
+    async def fetch(self, endpoint: str, key: str, url: str) -> Tuple[int, Any]:
+        """
+        GET a JSON endpoint through the cache
+
+        Args:
+            endpoint: Registered endpoint name
+            key: Normalized query identifying the response (e.g. lowercased word)
+            url: Request URL, used only on a miss
+
+        Returns:
+            tuple: (status: int, data) as from http_client.get_json
+        """
+        upstream = self._endpoints[endpoint]
+        cached = upstream.memory.get(key, MISSING)
+        if cached is not MISSING:
+            return cached
+
+        # Single flight: every concurrent miss for this key awaits the same task. The
+        # shield keeps one caller's cancellation from cancelling it for the others,
+        # and an error reaches every waiter.
+        future = upstream.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(upstream, key, url))
+            upstream.inflight[key] = future
+            future.add_done_callback(lambda done: self._landed(upstream, key, done))
+        else:
+            upstream.coalesced += 1
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _landed(upstream: Upstream, key: str, future: asyncio.Future):
+        upstream.inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # Mark retrieved in case every waiter was cancelled
+
+    async def _load(self, upstream: Upstream, key: str, url: str) -> Tuple[int, Any]:
+        """Second tier, then the network; runs once per key however many callers wait"""
+        endpoint = upstream.name
+        if self.persist:
+            row = await db.get_search_cache(endpoint, key)
+            if row is not None:
+                response = (row["status"], json.loads(row["body"]) if row["body"] else None)
+                upstream.memory.set(key, response, ttl=row["expires_at"] - time.time())
+                upstream.disk_hits += 1
+                return response
+
+        response = await self._request(upstream, url)
+        await self._store(upstream, key, response)
+        return response
+
+    async def _request(self, upstream: Upstream, url: str) -> Tuple[int, Any]:
+        """One guarded network lookup: breaker, concurrency cap, budget and hedging"""
+        if upstream.active >= upstream.max_concurrent or not upstream.breaker.allow():
+            upstream.rejected += 1
+            raise UpstreamUnavailable(upstream, upstream.breaker.state)
+
+        upstream.fetches += 1
+        upstream.active += 1
+        try:
+            status, data = await asyncio.wait_for(self._hedged(upstream, url), upstream.budget)
+        except Exception as e:
+            # Timeouts, connection errors and undecodable bodies all count against the endpoint
+            upstream.breaker.record(False)
+            LOGGER.warning(f"Upstream {upstream.name} failed: {type(e).__name__} {e}")
+            raise UpstreamUnavailable(upstream, type(e).__name__) from e
+        finally:
+            upstream.active -= 1
+            upstream.breaker.release()
+
+        upstream.breaker.record(status < 500 and status != 429)
+        return status, data
+
+    async def _hedged(self, upstream: Upstream, url: str) -> Tuple[int, Any]:
+        """Send the request; if it outlasts the endpoint's p95, race a duplicate against it"""
+        tasks = {asyncio.ensure_future(http_client.get_json(upstream.name, url))}
+        try:
+            delay = upstream.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    upstream.hedges += 1
+                    tasks.add(asyncio.ensure_future(http_client.get_json(upstream.name, url)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _store(self, upstream: Upstream, key: str, response: Tuple[int, Any]):
+        ttl = upstream.ttl_for(response[0])
+        if ttl is None:
+            return
+        upstream.memory.set(key, response, ttl=ttl)
+        if not self.persist:
+            return
+        try:
+            status, data = response
+            body = json.dumps(data) if data is not None else None
+            await db.set_search_cache(upstream.name, key, status, body, time.time() + ttl)
+            self._stores += 1
+            if self._stores % self.prune_every == 0:
+                await db.prune_search_cache(self.disk_max_rows)
+        except Exception as e:
+            # The memory tier already has it; persistence is best effort
+            LOGGER.warning(f"Search cache write failed for {upstream.name}: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint cache size, hits by tier, upstream fetches, coalesced lookups and hit ratio"""
+        return {name: upstream.stats() for name, upstream in self._endpoints.items()}
+
+# Process-wide upstream registry used by the search plugin
+upstreams = Upstreams(
+    persist=Config.SEARCH_CACHE_PERSIST,
+    disk_max_rows=Config.SEARCH_CACHE_DISK_MAX
+)
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(Config.UPSTREAM_BREAKER_FAILURES, Config.UPSTREAM_BREAKER_RESET)
+
+# Articles and definitions change rarely; a missing page may be created, so 404s expire sooner
+upstreams.register(Upstream(
+    "wiki", "Wikipedia", ttl=86400, negative_ttl=3600, maxsize=Config.SEARCH_CACHE_SIZE,
+    budget=Config.UPSTREAM_BUDGET, breaker=_breaker()
+))
+upstreams.register(Upstream(
+    "translate", "Google Translate", ttl=7 * 86400, negative_ttl=3600, maxsize=Config.SEARCH_CACHE_SIZE,
+    budget=Config.UPSTREAM_BUDGET, breaker=_breaker()
+))
+upstreams.register(Upstream(
+    "dictionary", "The dictionary", ttl=7 * 86400, negative_ttl=86400, maxsize=Config.SEARCH_CACHE_SIZE,
+    budget=Config.UPSTREAM_BUDGET, breaker=_breaker()
+))